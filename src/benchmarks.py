@@ -0,0 +1,121 @@
+"""
+性能基准
+
+示例:
+    python -m src.benchmarks --height 1000000 --hit-ratio 0.3
+"""
+
+import argparse
+import time
+from typing import Callable, List
+import numpy as np
+from src.matching import pick_split_points
+
+
+def _pick_split_points_loop(
+    scores: np.ndarray, threshold: float, min_distance: int
+) -> List[int]:
+    """原来的实现：去重排序后逐个遍历，保留每簇的第一个位置"""
+    split_points = sorted(set(np.where(scores >= threshold)[0].tolist()))
+    filtered_split_points = []
+    last_point = -min_distance
+    for point in split_points:
+        if point - last_point >= min_distance:
+            filtered_split_points.append(point)
+            last_point = point
+    return filtered_split_points
+
+
+def _noisy_scores(height: int, hit_ratio: float, seed: int = 0) -> np.ndarray:
+    """生成噪声较大的匹配得分，约 hit_ratio 的位置超过 0.9"""
+    rng = np.random.default_rng(seed)
+    scores = rng.random(height, dtype=np.float32) * 0.9
+    hits = rng.random(height) < hit_ratio
+    scores[hits] = 0.9 + rng.random(int(hits.sum()), dtype=np.float32) * 0.1
+    return scores
+
+
+def _clean_scores(height: int, period: int = 1430, seed: int = 0) -> np.ndarray:
+    """生成干净模板的匹配得分：每页边界只有一个位置超过阈值"""
+    rng = np.random.default_rng(seed)
+    scores = rng.random(height, dtype=np.float32) * 0.8
+    scores[period::period] = 1.0
+    return scores
+
+
+def _best_time(func: Callable, repeat: int) -> float:
+    """多次运行取最短用时（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_pick_split_points(
+    scores: np.ndarray, min_distance: int = 15, repeat: int = 5
+) -> dict:
+    """对比向量化的 pick_split_points 与原来的 Python 循环"""
+    loop_points = _pick_split_points_loop(scores, 0.9, min_distance)
+    vector_points = pick_split_points(scores, 0.9, min_distance)
+    loop_seconds = _best_time(
+        lambda: _pick_split_points_loop(scores, 0.9, min_distance), repeat
+    )
+    vector_seconds = _best_time(
+        lambda: pick_split_points(scores, 0.9, min_distance), repeat
+    )
+    return {
+        "height": len(scores),
+        "candidates": int((scores >= 0.9).sum()),
+        "loop_points": loop_points,
+        "vector_points": vector_points,
+        "loop_seconds": loop_seconds,
+        "vector_seconds": vector_seconds,
+        "speedup": loop_seconds / vector_seconds,
+    }
+
+
+def _report(title: str, result: dict):
+    print(
+        f"pick_split_points（{title}）: {result['height']} 行，"
+        f"{result['candidates']} 个候选位置\n"
+        f"  Python 循环: {result['loop_seconds'] * 1000:.1f} ms，"
+        f"{len(result['loop_points'])} 个分割点\n"
+        f"  向量化:      {result['vector_seconds'] * 1000:.1f} ms，"
+        f"{len(result['vector_points'])} 个分割点\n"
+        f"  加速比: {result['speedup']:.1f}x"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.benchmarks")
+    parser.add_argument("--height", type=int, default=1_000_000, help="得分长度")
+    parser.add_argument(
+        "--hit-ratio", type=float, default=0.3, help="噪声得分中超过阈值的位置比例"
+    )
+    parser.add_argument("--min-distance", type=int, default=15, help="最小间距")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数")
+    args = parser.parse_args(argv)
+
+    # 干净模板：每段超过阈值的位置只有一个，两种实现的结果必须相同
+    clean = bench_pick_split_points(
+        _clean_scores(args.height), args.min_distance, args.repeat
+    )
+    if clean["loop_points"] != clean["vector_points"]:
+        raise AssertionError("干净模板的得分上，向量化实现与原来的循环结果不同")
+    _report("干净模板", clean)
+
+    # 噪声得分：原来的循环保留每簇第一个位置，向量化实现保留每段的峰值，
+    # 分割点不同，用时只作参考
+    noisy = bench_pick_split_points(
+        _noisy_scores(args.height, args.hit_ratio), args.min_distance, args.repeat
+    )
+    _report("噪声得分", noisy)
+    print(
+        "  注意: 噪声得分上两者保留的位置不同（第一个位置 / 峰值），分割点不可直接比较"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+命令行入口（无需图形界面），可批量并行处理截图
+
+示例:
+    python -m src.cli screenshots/ --width 100 1100 --feature 1400 1430 --jobs 4
+    python -m src.cli first.png --width 100 1100 --feature 1400 1430 --save-template site
+    python -m src.cli screenshots/ --template site --jobs 4
+    python -m src.cli screenshots/ --detector projection
+    python -m src.cli shots/ --stitch --detector projection
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional
+from loguru import logger
+from src.image_splitter import ImageSplitter
+from src.match_cache import MatchCache
+from src.projection import detect_width_range
+from src.shared_image import decode_image
+from src.stitcher import Stitcher, sequence_sort_key
+from src.templates import BoundaryTemplate, TemplateLibrary
+from src.watcher import IMAGE_SUFFIXES, job_options
+
+
+def collect_inputs(inputs: List[str]) -> List[Path]:
+    """展开输入参数：文件直接使用，目录取其中的图片文件"""
+    files = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            files.extend(
+                sorted(p for p in path.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+            )
+        else:
+            files.append(path)
+    return files
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli", description="根据边界分割长截图并生成PDF"
+    )
+    parser.add_argument("inputs", nargs="+", help="图片文件或包含图片的目录")
+    parser.add_argument(
+        "--width",
+        nargs=2,
+        type=int,
+        metavar=("START_X", "END_X"),
+        help="宽度裁剪范围，默认取模板保存的范围，没有时自动检测内容区域",
+    )
+    feature = parser.add_mutually_exclusive_group()
+    feature.add_argument(
+        "--feature",
+        nargs=2,
+        type=int,
+        metavar=("START_Y", "END_Y"),
+        help="特征区域范围（在每张图片中截取模板）",
+    )
+    feature.add_argument(
+        "--template",
+        nargs="+",
+        help="模板库中的模板名称，或特征模板图片路径；可指定多个不同样式的分割线",
+    )
+    parser.add_argument("--templates-dir", default="templates", help="模板库目录")
+    parser.add_argument(
+        "--save-template",
+        metavar="NAME",
+        help="把 --feature 截取的模板（取第一张图片）和参数保存到模板库",
+    )
+    parser.add_argument(
+        "-o", "--output", default="output", help="输出根目录，每张图片一个任务目录"
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="并行处理的进程数")
+    parser.add_argument(
+        "--threshold", type=float, help="匹配阈值（默认 0.9 或模板保存的阈值）"
+    )
+    parser.add_argument(
+        "--method",
+        choices=["template", "signature", "pyramid", "predictive"],
+        help="匹配方法（默认 template 或模板保存的方法）",
+    )
+    parser.add_argument(
+        "--detector",
+        default="template",
+        choices=["template", "projection"],
+        help="分割点检测方式：template 需要 --feature 或 --template，"
+        "projection 自动检测页面之间的纯色间隔",
+    )
+    parser.add_argument(
+        "--gap-min-height", type=int, default=10, help="纯色间隔的最小行数"
+    )
+    parser.add_argument(
+        "--gap-tolerance", type=int, default=8, help="纯色间隔允许的颜色波动"
+    )
+    parser.add_argument(
+        "--gap-color",
+        nargs=3,
+        type=int,
+        metavar=("R", "G", "B"),
+        help="纯色间隔的颜色，默认任意颜色",
+    )
+    parser.add_argument("--streaming", action="store_true", help="流式处理超长图片")
+    parser.add_argument(
+        "--stitch",
+        action="store_true",
+        help="输入是按滚动顺序截取、相邻有重叠的多张截图，先拼接为一张长图再分割",
+    )
+    parser.add_argument(
+        "--strip-height", type=int, default=4096, help="流式模式下的条带行数"
+    )
+    parser.add_argument(
+        "--format", default="png", choices=["png", "jpeg"], help="分割图片的格式"
+    )
+    parser.add_argument("--quality", type=int, default=90, help="JPEG 编码质量")
+    parser.add_argument(
+        "--no-images", action="store_true", help="只生成PDF，不保存分割图片"
+    )
+    parser.add_argument(
+        "--previous",
+        metavar="JOB_DIR",
+        help="同一文档上次处理的任务目录：新截图只是在底部延长时，"
+        "沿用未变化的图片，只处理新增部分（只能输入一张图片）",
+    )
+    parser.add_argument(
+        "--dedup",
+        type=int,
+        metavar="DISTANCE",
+        help="去除重复页面：感知哈希（256 位）距离不超过 DISTANCE 的页面只保留一张，常用 8",
+    )
+    parser.add_argument("--cache-dir", default="cache/match", help="匹配得分缓存目录")
+    parser.add_argument(
+        "--no-cache", action="store_true", help="不读取也不写入匹配得分缓存"
+    )
+    parser.add_argument("--log-level", default="WARNING", help="日志级别")
+    return parser
+
+
+def _setup_logging(level: str):
+    """日志输出到 stderr，stdout 只用于 JSON 结果"""
+    logger.remove()
+    logger.add(sys.stderr, level=level)
+
+
+def _run_job(file_path: str, options: dict) -> dict:
+    """在工作进程中处理单张图片，返回结果记录"""
+    start = time.perf_counter()
+    try:
+        splitter = ImageSplitter(image_path=file_path, **options)
+        pdf_path = splitter.process()
+        return {
+            "file": file_path,
+            "status": "ok",
+            "job_dir": str(splitter.job_dir),
+            "pdf": str(pdf_path) if pdf_path else None,
+            "scanned_positions": splitter.manifest.scanned_positions,
+            "total_positions": splitter.manifest.total_positions,
+            "duplicates": len(splitter.manifest.duplicates),
+            "reused": splitter.manifest.reused,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+    except Exception as e:
+        logger.error(f"处理图片时出错：{file_path}: {str(e)}")
+        return {
+            "file": file_path,
+            "status": "error",
+            "error": str(e),
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+
+def _run_stitched(files: List[Path], options: dict) -> int:
+    """把所有输入拼接为一张虚拟长图，作为一个任务处理"""
+    files = sorted(files, key=sequence_sort_key)
+    try:
+        source = Stitcher(width_range=options["width_range"]).stitch(files)
+    except Exception as e:
+        print(json.dumps({"status": "error", "error": str(e)}, ensure_ascii=False))
+        return 1
+    options["strip_source"] = source
+    options["encode_workers"] = os.cpu_count() or 1
+    result = _run_job(str(files[0]), options)
+    result["shots"] = len(files)
+    print(json.dumps(result, ensure_ascii=False), flush=True)
+    return 0 if result["status"] == "ok" else 1
+
+
+def _load_template(library: TemplateLibrary, name: str, args) -> BoundaryTemplate:
+    """按名称在模板库中查找模板，找不到时作为图片路径读取"""
+    if name in library:
+        return library.load(name)
+    if not Path(name).is_file():
+        raise FileNotFoundError(f"模板库中没有该模板，也不是图片文件: {name}")
+    return BoundaryTemplate(
+        Path(name).stem,
+        decode_image(name),
+        tuple(args.width) if args.width else None,
+        match_method=args.method or "template",
+    )
+
+
+def _resolve_templates(args, first_file: Path) -> List[BoundaryTemplate]:
+    """
+    根据 --template / --save-template 得到模板
+
+    使用 --feature 且不保存模板时返回空列表（每张图片各自截取模板）。
+    """
+    library = TemplateLibrary(args.templates_dir)
+    if args.template is not None:
+        return [_load_template(library, name, args) for name in args.template]
+
+    if args.save_template is None:
+        return []
+    image = decode_image(str(first_file))
+    template = BoundaryTemplate.from_image(
+        args.save_template,
+        image,
+        tuple(args.width) if args.width else detect_width_range(image),
+        tuple(args.feature),
+        threshold=0.9 if args.threshold is None else args.threshold,
+        match_method=args.method or "template",
+        metadata={"source": first_file.name},
+    )
+    library.save(template)
+    return []
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    _setup_logging(args.log_level)
+
+    files = collect_inputs(args.inputs)
+    if not files:
+        print(json.dumps({"status": "error", "error": "没有找到图片文件"}))
+        return 1
+
+    if args.previous and len(files) > 1:
+        error = {"status": "error", "error": "--previous 只能处理一张图片"}
+        print(json.dumps(error, ensure_ascii=False))
+        return 1
+
+    if args.save_template and not args.feature:
+        error = {"status": "error", "error": "--save-template 需要同时指定 --feature"}
+        print(json.dumps(error, ensure_ascii=False))
+        return 1
+
+    if args.detector == "template" and not (args.feature or args.template):
+        error = {"status": "error", "error": "必须指定 --feature 或 --template"}
+        print(json.dumps(error, ensure_ascii=False))
+        return 1
+
+    try:
+        templates = _resolve_templates(args, files[0])
+    except Exception as e:
+        print(json.dumps({"status": "error", "error": str(e)}, ensure_ascii=False))
+        return 1
+
+    # 命令行参数优先，其次是第一个模板保存的参数
+    # 都没有时由 ImageSplitter 自动检测每张图片的内容区域
+    jobs = max(1, args.jobs)
+    spec = {
+        "width": args.width,
+        "feature": args.feature,
+        "threshold": args.threshold,
+        "method": args.method,
+        "detector": args.detector,
+        "format": args.format,
+        "dedup": args.dedup,
+    }
+    options = job_options(
+        spec,
+        TemplateLibrary(args.templates_dir),
+        args.output,
+        None if args.no_cache else MatchCache(args.cache_dir),
+        jobs,
+        templates=templates,
+    )
+    # 只有命令行提供的参数
+    options.update(
+        detector_options={
+            "min_height": args.gap_min_height,
+            "tolerance": args.gap_tolerance,
+            # 图片按 BGR 处理
+            "gap_color": tuple(reversed(args.gap_color)) if args.gap_color else None,
+        },
+        streaming=args.streaming,
+        strip_height=args.strip_height,
+        jpeg_quality=args.quality,
+        save_images=not args.no_images,
+        previous_job=args.previous,
+    )
+
+    if args.stitch:
+        return _run_stitched(files, options)
+
+    failed = 0
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_setup_logging, initargs=(args.log_level,)
+    ) as executor:
+        futures = [
+            executor.submit(_run_job, str(file_path), dict(options))
+            for file_path in files
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            failed += result["status"] != "ok"
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+from typing import Iterator, List
+import cv2
+import numpy as np
+from loguru import logger
+from src.job_manifest import DuplicateRecord
+
+
+def dhash_bits(image: np.ndarray, hash_size: int = 16) -> np.ndarray:
+    """
+    计算差异哈希 (dHash)，返回 hash_size * hash_size 个布尔值
+
+    图片先缩小为 (hash_size + 1) x hash_size 的灰度图，
+    再比较每行相邻像素的大小。缩小使用 INTER_AREA，整个计算都是向量化的。
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return (small[:, 1:] > small[:, :-1]).ravel()
+
+
+class PageDeduplicator:
+    """
+    去除重复和几乎相同的页面
+
+    对每一页计算感知哈希，与之前保留的所有页面比较（一次向量化的汉明距离计算），
+    距离不超过 max_distance 且高度相近的页面视为重复，直接丢弃。
+    保留的页面重新连续编号，去除的页面记录在 removed 中。
+    """
+
+    def __init__(
+        self, max_distance: int = 8, hash_size: int = 16, height_tolerance: float = 0.05
+    ):
+        """
+        Args:
+            max_distance: 视为重复的最大汉明距离（共 hash_size * hash_size 位）
+            hash_size: 哈希边长，文档页面文字细碎，比常用的 8 更大才能区分
+            height_tolerance: 允许的高度相对差异，高度差别大的页面不算重复
+        """
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.height_tolerance = height_tolerance
+        self.removed: List[DuplicateRecord] = []
+
+    def filter(self, slices: Iterator) -> Iterator:
+        """过滤 PageSlice 序列，只交出不重复的页面"""
+        hashes = np.empty((0, self.hash_size * self.hash_size), dtype=bool)
+        heights = np.empty(0, dtype=np.int64)
+        for page in slices:
+            bits = dhash_bits(page.image, self.hash_size)
+            height = page.image.shape[0]
+
+            distances = np.count_nonzero(hashes != bits, axis=1)
+            similar_height = np.abs(
+                heights - height
+            ) <= self.height_tolerance * np.maximum(heights, height)
+            candidates = np.flatnonzero(
+                (distances <= self.max_distance) & similar_height
+            )
+            if candidates.size:
+                kept = int(candidates[np.argmin(distances[candidates])])
+                duplicate = DuplicateRecord(
+                    page.start_y, height, kept, int(distances[kept])
+                )
+                self.removed.append(duplicate)
+                logger.info(
+                    f"去除重复页面: 第 {page.index + 1} 张与保留的第 {kept + 1} 页相同"
+                    f"（距离 {duplicate.distance}）"
+                )
+                continue
+
+            hashes = np.vstack([hashes, bits])
+            heights = np.append(heights, height)
+            yield page._replace(index=len(heights) - 1)
@@ -0,0 +1,500 @@
+"""
+本机 HTTP 任务接口（可选，只使用标准库，无需图形界面）
+
+其他工具可以通过 HTTP 上传截图、提交分割任务、查询进度并下载结果。
+任务在进程池中运行，上传的图片边接收边写入磁盘。默认只监听 127.0.0.1。
+
+示例:
+    python -m src.http_api --port 8765 --workers 2
+
+接口:
+    POST /uploads?name=page.png   请求体为图片内容，返回 upload_id
+    POST /jobs                    JSON 参数，见 submit_job，返回 job_id
+    GET  /jobs/<job_id>           任务状态、进度 (0 到 1) 和最近的日志
+    GET  /jobs/<job_id>/pdf       下载 PDF
+    GET  /jobs/<job_id>/zip       下载全部分割图片的 zip
+    GET  /templates               模板库中的模板名称
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+import signal
+import sys
+import threading
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+from loguru import logger
+from src.cli import _setup_logging
+from src.image_splitter import ImageSplitter
+from src.job_manifest import JobManifest
+from src.match_cache import MatchCache
+from src.templates import TemplateLibrary
+from src.watcher import IMAGE_SUFFIXES, job_options
+
+CHUNK_SIZE = 1024 * 1024  # 上传和下载时每次读写的字节数
+MAX_JSON_SIZE = 64 * 1024  # POST /jobs 请求体的上限
+LOG_LINES = 100  # 每个任务保留的最近日志行数
+ZIP_NAME = "slices.zip"  # 任务目录中按需生成的图片压缩包
+
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# 工作进程中的事件队列，由 _init_worker 设置
+_events = None
+
+
+class HttpError(Exception):
+    """返回给客户端的错误响应"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class ApiJob:
+    """一个通过接口提交的任务"""
+
+    job_id: str
+    source: str
+    status: str = "queued"  # queued / running / done / failed
+    progress: float = 0.0  # 0 到 1，由 ImageSplitter 的 progress_callback 更新
+    log: Deque[str] = field(default_factory=lambda: deque(maxlen=LOG_LINES))
+    job_dir: Optional[str] = None
+    pdf: Optional[str] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "source": self.source,
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "log": list(self.log),
+            "job_dir": self.job_dir,
+            "pdf": self.pdf,
+            "error": self.error,
+        }
+
+
+def _init_worker(events, log_level: str):
+    """工作进程初始化：配置日志，保存事件队列，中断信号交给主进程处理"""
+    global _events
+    # spawn 启动的进程不继承主进程的日志配置
+    _setup_logging(log_level)
+    _events = events
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _run_job(job_id: str, file_path: str, options: dict) -> Tuple[str, Optional[str]]:
+    """在工作进程中处理单张图片，进度和日志通过事件队列发回主进程"""
+    _events.put((job_id, "status", "running"))
+    splitter = ImageSplitter(
+        image_path=file_path,
+        progress_callback=lambda value: _events.put((job_id, "progress", value)),
+        log_callback=lambda message: _events.put((job_id, "log", message)),
+        **options,
+    )
+    pdf_path = splitter.process()
+    return str(splitter.job_dir), str(pdf_path) if pdf_path else None
+
+
+def _build_zip(job_dir: Path) -> Path:
+    """把任务目录中的分割图片打包（图片已经压缩，直接存储）"""
+    path = job_dir / ZIP_NAME
+    if path.is_file():
+        return path
+    manifest = JobManifest.load(job_dir)
+    temp_path = path.with_name(f"{ZIP_NAME}.{os.getpid()}.tmp")
+    with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_STORED) as archive:
+        for record in manifest.slices:
+            if record.file is not None:
+                archive.write(job_dir / record.file, Path(record.file).name)
+    os.replace(temp_path, path)
+    return path
+
+
+class JobServer:
+    """
+    基于 asyncio 的 HTTP 服务
+
+    事件循环只负责收发数据，分割在进程池中进行；
+    工作进程的进度和日志经 multiprocessing 队列由一个后台线程转回事件循环。
+    排队和运行中的任务达到 max_pending 时拒绝新任务 (503)。
+    """
+
+    def __init__(
+        self,
+        upload_dir: str = "uploads",
+        output_dir: str = "output",
+        templates_dir: str = "templates",
+        match_cache: Optional[MatchCache] = None,
+        workers: int = 1,
+        max_pending: int = 32,
+        max_upload: int = 512 * 1024 * 1024,
+        log_level: str = "INFO",
+    ):
+        """
+        Args:
+            upload_dir: 上传图片的保存目录
+            output_dir: 输出根目录
+            templates_dir: 模板库目录
+            match_cache: 匹配结果缓存
+            workers: 工作进程数
+            max_pending: 排队和运行中的任务上限
+            max_upload: 单个上传文件的字节数上限
+            log_level: 工作进程的日志级别
+        """
+        self.upload_dir = Path(upload_dir)
+        self.output_dir = output_dir
+        self.library = TemplateLibrary(templates_dir)
+        self.match_cache = match_cache
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_upload = max_upload
+        self.log_level = log_level
+        self.jobs: Dict[str, ApiJob] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.events = None
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        """启动服务，直到被取消"""
+        self.loop = asyncio.get_running_loop()
+        # 用 spawn 启动工作进程，不复制正在运行的事件循环和线程
+        context = multiprocessing.get_context("spawn")
+        self.events = context.Queue()
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.events, self.log_level),
+        )
+        pump = threading.Thread(target=self._pump_events, daemon=True)
+        pump.start()
+        server = await asyncio.start_server(self.handle, host, port)
+        logger.info(f"HTTP 服务已启动: http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.events.put(None)
+
+    def _pump_events(self):
+        """后台线程：把工作进程发来的事件转交给事件循环"""
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            self.loop.call_soon_threadsafe(self._apply_event, *event)
+
+    def _apply_event(self, job_id: str, kind: str, value):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if job.status in ("done", "failed"):
+            return  # 事件可能晚于任务结果到达
+        if kind == "status":
+            job.status = value
+        elif kind == "progress":
+            job.progress = value
+        elif kind == "log":
+            job.log.append(value)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个连接上的一个请求"""
+        try:
+            method, target, headers = await self._read_head(reader)
+            url = urlsplit(target)
+            status, body = await self.route(method, url, headers, reader, writer)
+            if body is not None:
+                await self._send_json(writer, status, body)
+        except HttpError as e:
+            await self._send_json(
+                writer, e.status, {"status": "error", "error": str(e)}
+            )
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.exception(f"处理请求时出错: {e}")
+            await self._send_json(
+                writer,
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                {"status": "error", "error": str(e)},
+            )
+        finally:
+            writer.close()
+
+    async def route(self, method: str, url, headers: dict, reader, writer):
+        """分发请求，返回 (状态码, JSON 响应)，已直接发送文件时 JSON 为 None"""
+        parts = [part for part in url.path.split("/") if part]
+        if method == "POST" and parts == ["uploads"]:
+            return HTTPStatus.CREATED, await self.receive_upload(url, headers, reader)
+        if method == "POST" and parts == ["jobs"]:
+            spec = await self._read_json(headers, reader)
+            return HTTPStatus.ACCEPTED, self.submit_job(spec)
+        if method == "GET" and parts == ["templates"]:
+            return HTTPStatus.OK, {"templates": self.library.names()}
+        if method == "GET" and len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise HttpError(HTTPStatus.NOT_FOUND, f"任务不存在: {parts[1]}")
+            if len(parts) == 2:
+                return HTTPStatus.OK, job.to_dict()
+            await self.send_result(job, parts[2], writer)
+            return HTTPStatus.OK, None
+        raise HttpError(HTTPStatus.NOT_FOUND, f"未知的接口: {method} {url.path}")
+
+    async def receive_upload(self, url, headers: dict, reader) -> dict:
+        """把请求体分块写入磁盘，不在内存中保存整个文件"""
+        name = Path(parse_qs(url.query).get("name", ["upload.png"])[0]).name
+        if Path(name).suffix.lower() not in IMAGE_SUFFIXES:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"不支持的图片格式: {name}")
+        remaining = self._content_length(headers)
+        if remaining > self.max_upload:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "上传文件过大")
+
+        upload_id = uuid.uuid4().hex
+        directory = self.upload_dir / upload_id
+        directory.mkdir(parents=True)
+        path = directory / name
+        temp_path = directory / f"{name}.part"
+        try:
+            with open(temp_path, "wb") as handle:
+                while remaining:
+                    chunk = await reader.read(min(remaining, CHUNK_SIZE))
+                    if not chunk:
+                        raise HttpError(HTTPStatus.BAD_REQUEST, "上传内容不完整")
+                    await asyncio.to_thread(handle.write, chunk)
+                    remaining -= len(chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            directory.rmdir()
+            raise
+        logger.info(f"已接收上传: {name} ({path.stat().st_size} 字节)")
+        return {"upload_id": upload_id, "path": str(path)}
+
+    def submit_job(self, spec: dict) -> dict:
+        """
+        提交分割任务
+
+        spec 中用 upload_id（POST /uploads 的返回值）或 path（本机文件路径）指定图片，
+        其余键与监视目录的规则相同: width、feature、template、threshold、method、
+        detector、format、dedup。
+        """
+        file_path = self._resolve_source(spec)
+        active = sum(job.status in ("queued", "running") for job in self.jobs.values())
+        if active >= self.max_pending:
+            raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, "任务队列已满，请稍后重试")
+        try:
+            options = job_options(
+                spec, self.library, self.output_dir, self.match_cache, self.workers
+            )
+        except KeyError as e:
+            raise HttpError(HTTPStatus.NOT_FOUND, e.args[0])
+        except (TypeError, ValueError) as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"任务参数无效: {e}")
+
+        job = ApiJob(job_id=uuid.uuid4().hex, source=str(file_path))
+        self.jobs[job.job_id] = job
+        future = self.loop.run_in_executor(
+            self.executor, _run_job, job.job_id, str(file_path), options
+        )
+        future.add_done_callback(lambda f: self._job_finished(job, f))
+        logger.info(f"新任务 {job.job_id}: {file_path}")
+        return {"job_id": job.job_id, "status": job.status}
+
+    def _resolve_source(self, spec: dict) -> Path:
+        if spec.get("upload_id") is not None:
+            upload_id = str(spec["upload_id"])
+            directory = self.upload_dir / upload_id
+            if not UPLOAD_ID_PATTERN.match(upload_id) or not directory.is_dir():
+                raise HttpError(HTTPStatus.NOT_FOUND, f"上传不存在: {upload_id}")
+            files = [p for p in directory.iterdir() if p.suffix != ".part"]
+            if not files:
+                raise HttpError(HTTPStatus.NOT_FOUND, f"上传不存在: {upload_id}")
+            return files[0]
+        if spec.get("path") is not None:
+            path = Path(spec["path"])
+            if not path.is_file():
+                raise HttpError(HTTPStatus.NOT_FOUND, f"文件不存在: {path}")
+            return path
+        raise HttpError(HTTPStatus.BAD_REQUEST, "必须指定 upload_id 或 path")
+
+    def _job_finished(self, job: ApiJob, future: asyncio.Future):
+        if future.cancelled():
+            job.status, job.error = "failed", "任务已取消"
+            return
+        error = future.exception()
+        if error is not None:
+            job.status, job.error = "failed", str(error)
+            logger.error(f"任务 {job.job_id} 失败: {error}")
+            return
+        job.job_dir, job.pdf = future.result()
+        job.status, job.progress = "done", 1.0
+        logger.success(f"任务 {job.job_id} 完成: {job.job_dir}")
+
+    async def send_result(self, job: ApiJob, kind: str, writer):
+        """下载任务的 PDF 或图片压缩包"""
+        if job.status != "done":
+            raise HttpError(HTTPStatus.CONFLICT, f"任务尚未完成: {job.status}")
+        if kind == "pdf":
+            if job.pdf is None:
+                raise HttpError(HTTPStatus.NOT_FOUND, "任务没有生成 PDF")
+            await self._send_file(writer, Path(job.pdf), "application/pdf")
+        elif kind == "zip":
+            path = await asyncio.to_thread(_build_zip, Path(job.job_dir))
+            await self._send_file(
+                writer,
+                path,
+                "application/zip",
+                f"{Path(job.source).stem}-{job.job_id}.zip",
+            )
+        else:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"未知的下载类型: {kind}")
+
+    @staticmethod
+    async def _read_head(reader: asyncio.StreamReader) -> Tuple[str, str, dict]:
+        """读取请求行和请求头"""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "请求头过大")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "请求行无效")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        return method.upper(), target, headers
+
+    @staticmethod
+    def _content_length(headers: dict) -> int:
+        if "content-length" not in headers:
+            raise HttpError(HTTPStatus.LENGTH_REQUIRED, "需要 Content-Length")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Content-Length 无效")
+        if length < 0:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Content-Length 无效")
+        return length
+
+    async def _read_json(self, headers: dict, reader) -> dict:
+        length = self._content_length(headers)
+        if length > MAX_JSON_SIZE:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "请求体过大")
+        try:
+            spec = json.loads(await reader.readexactly(length) or b"{}")
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"JSON 无效: {e}")
+        if not isinstance(spec, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "请求体必须是 JSON 对象")
+        return spec
+
+    @staticmethod
+    def _start_response(
+        writer, status: int, content_type: str, length: int, extra: Sequence[str] = ()
+    ):
+        status = HTTPStatus(status)
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {length}",
+            "Connection: close",
+            *extra,
+        ]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("utf-8"))
+
+    async def _send_json(self, writer, status: int, data: dict):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self._start_response(
+            writer, status, "application/json; charset=utf-8", len(body)
+        )
+        writer.write(body)
+        await writer.drain()
+
+    async def _send_file(
+        self, writer, path: Path, content_type: str, filename: Optional[str] = None
+    ):
+        """分块发送文件，不把整个文件读入内存"""
+        filename = filename or path.name
+        self._start_response(
+            writer,
+            status=HTTPStatus.OK,
+            content_type=content_type,
+            length=path.stat().st_size,
+            extra=[
+                f"Content-Disposition: attachment; filename*=UTF-8''{quote(filename)}"
+            ],
+        )
+        with open(path, "rb") as handle:
+            while True:
+                chunk = await asyncio.to_thread(handle.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.http_api", description="本机 HTTP 任务接口"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("-o", "--output", default="output", help="输出根目录")
+    parser.add_argument("--uploads", default="uploads", help="上传图片的保存目录")
+    parser.add_argument("--templates-dir", default="templates", help="模板库目录")
+    parser.add_argument("--cache-dir", default="cache/match", help="匹配结果缓存目录")
+    parser.add_argument("--no-cache", action="store_true", help="不使用匹配结果缓存")
+    parser.add_argument("--workers", type=int, default=1, help="工作进程数")
+    parser.add_argument(
+        "--max-pending", type=int, default=32, help="排队和运行中的任务上限"
+    )
+    parser.add_argument(
+        "--max-upload", type=int, default=512, help="单个上传文件的上限 (MB)"
+    )
+    parser.add_argument("--log-level", default="INFO", help="日志级别")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    _setup_logging(args.log_level)
+
+    server = JobServer(
+        upload_dir=args.uploads,
+        output_dir=args.output,
+        templates_dir=args.templates_dir,
+        match_cache=None if args.no_cache else MatchCache(args.cache_dir),
+        workers=max(1, args.workers),
+        max_pending=args.max_pending,
+        max_upload=args.max_upload * 1024 * 1024,
+        log_level=args.log_level,
+    )
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        logger.info("HTTP 服务已停止")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,12 +3,15 @@ from tkinter import filedialog, messagebox, ttk
 from PIL import ImageTk
 from src.image_processor import ImageProcessor
 from src.image_splitter import ImageSplitter
+from src.match_cache import MatchCache
+from src.projection import detect_width_range
 from loguru import logger
 from pathlib import Path
 import os
 import subprocess
 import threading
 import queue  # 导入 queue 模块
+import numpy as np
 
 # 配置日志
 log_path = Path("../logs")
@@ -23,6 +26,10 @@ logger.add(
 
 
 class ImageCropper:
+    THRESHOLD_RANGE = (0.5, 1.0)  # 滑块和直方图的阈值范围
+    HISTOGRAM_WIDTH = 220
+    HISTOGRAM_HEIGHT = 80
+
     def __init__(self, root):
         logger.info("启动图片裁剪工具")
         self.root = root
@@ -54,15 +61,18 @@ class ImageCropper:
         initial_height = int(screen_height * 0.8)
 
         # 初始化图像处理器
-        self.processor = ImageProcessor()
+        self.processor = ImageProcessor(match_cache=MatchCache())
 
         # 初始化变量
-        self.photo = None
+        self.tile_items = {}  # 图块序号 -> (画布对象, PhotoImage)，只保留可见的图块
         self.canvas = None
         self.start_x = None
         self.rect = None
         self.selection = None
         self.vertical_selection = None  # 垂直分割选择
+        self.threshold_var = tk.DoubleVar(value=0.9)  # 匹配阈值
+        self.score_queue = queue.Queue()  # 后台计算完成的匹配得分
+        self.computing_selection = None  # 后台正在计算匹配得分的选择
         self.current_language = "zh"  # 默认语言为中文
         self.setup_language()
 
@@ -79,6 +89,7 @@ class ImageCropper:
         # 创建一个队列用于线程间通信
         self.log_queue = queue.Queue()
         self.root.after(100, self.process_log_queue)  # 定期处理日志队列
+        self.root.after(100, self.process_score_queue)  # 定期检查匹配得分
 
     def setup_language(self):
         self.text = {
@@ -90,19 +101,25 @@ class ImageCropper:
                 "process_button": "Process Image",
                 "log_label": "Processing Log",
                 "warn_select_feature": "Must select a feature area",
-                "warn_select_both": "Please select both crop width and feature area",
+                "warn_select_width": "Please select the crop width first",
                 "warn_no_split_points": "No matching split points found",
                 "msg_loading_image": "Loading image: {}",
                 "msg_image_loaded": "Image loaded, size: {}x{}",
                 "msg_cropped_width": "Cropped width: {}",
                 "msg_selected_width_range": "Selected crop width range: {}",
+                "msg_auto_width": "Detected content width range: {}",
                 "msg_selected_feature_range": "Selected feature area range: {}",
                 "msg_found_split_points": "Found {} split points",
+                "msg_auto_detect": "No feature area selected, detecting uniform gaps between pages",
                 "msg_processing_started": "Start processing image",
                 "msg_processing_completed": "Processing completed",
                 "msg_pdf_saved_to": "Processing completed! PDF saved to: {}",
                 "err_processing_image": "Error processing image: {}",
                 "err_opening_folder": "Error opening folder: {}",
+                "threshold_label": "Match Threshold",
+                "msg_computing_scores": "Computing match scores in the background...",
+                "msg_scores_ready": "Match scores ready, drag the slider to adjust the threshold",
+                "msg_threshold_points": "Threshold {:.3f}: {} split points",
                 "chinese": "中文",
                 "english": "English",
             },
@@ -114,19 +131,25 @@ class ImageCropper:
                 "process_button": "处理图片",
                 "log_label": "处理日志",
                 "warn_select_feature": "必须选择特征区域",
-                "warn_select_both": "请先选择裁剪宽度和特征区域",
+                "warn_select_width": "请先选择裁剪宽度",
                 "warn_no_split_points": "未找到匹配的分割点",
                 "msg_loading_image": "正在加载图片：{}",
                 "msg_image_loaded": "图片加载完成，尺寸：{}x{}",
                 "msg_cropped_width": "裁剪后的宽度：{}",
                 "msg_selected_width_range": "已选择裁剪宽度范围：{}",
+                "msg_auto_width": "自动检测的宽度范围：{}",
                 "msg_selected_feature_range": "已选择特征区域范围：{}",
                 "msg_found_split_points": "找到 {} 个分割点",
+                "msg_auto_detect": "未选择特征区域，自动检测页面之间的纯色间隔",
                 "msg_processing_started": "开始处理图片",
                 "msg_processing_completed": "图片处理完成",
                 "msg_pdf_saved_to": "处理完成！PDF保存在：{}",
                 "err_processing_image": "处理图片时出错：{}",
                 "err_opening_folder": "打开文件夹时出错：{}",
+                "threshold_label": "匹配阈值",
+                "msg_computing_scores": "正在后台计算匹配得分...",
+                "msg_scores_ready": "匹配得分计算完成，拖动滑块调整阈值",
+                "msg_threshold_points": "阈值 {:.3f}：{} 个分割点",
                 "chinese": "中文",
                 "english": "English",
             },
@@ -198,14 +221,27 @@ class ImageCropper:
         )
         self.process_button.pack(side="left", padx=5)
 
-        # 创建画布（放在左侧框架）
-        self.canvas = tk.Canvas(self.left_frame, highlightthickness=0, bg="white")
+        # 创建画布（放在左侧框架），可上下滚动查看整幅图片
+        self.canvas_scrollbar = tk.Scrollbar(
+            self.left_frame, orient="vertical", command=self.on_canvas_scroll
+        )
+        self.canvas_scrollbar.pack(side="right", fill="y")
+        self.canvas = tk.Canvas(
+            self.left_frame,
+            highlightthickness=0,
+            bg="white",
+            yscrollcommand=self.canvas_scrollbar.set,
+        )
         self.canvas.pack(expand=True, fill="both")
 
         # 绑定鼠标事件
         self.canvas.bind("<ButtonPress-1>", self.on_press)
         self.canvas.bind("<B1-Motion>", self.on_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_release)
+        self.canvas.bind("<Configure>", lambda _: self.render_visible_tiles())
+        self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)  # Windows / macOS
+        self.canvas.bind("<Button-4>", self.on_mouse_wheel)  # Linux 向上
+        self.canvas.bind("<Button-5>", self.on_mouse_wheel)  # Linux 向下
 
         # 添加日志文本框（放在右侧框架）
         # 添加标题标签
@@ -215,6 +251,36 @@ class ImageCropper:
             bg="#f0f0f0",
         ).pack(side="top", pady=(0, 5))
 
+        # 阈值调节：匹配得分直方图和滑块（放在右侧框架底部）
+        self.threshold_frame = tk.Frame(self.right_frame, bg="#f0f0f0")
+        self.threshold_frame.pack(side="bottom", fill="x", pady=(5, 0))
+        self.threshold_label = tk.Label(
+            self.threshold_frame,
+            text=self.text[self.current_language]["threshold_label"],
+            bg="#f0f0f0",
+        )
+        self.threshold_label.pack(side="top", anchor="w")
+        self.histogram_canvas = tk.Canvas(
+            self.threshold_frame,
+            width=self.HISTOGRAM_WIDTH,
+            height=self.HISTOGRAM_HEIGHT,
+            highlightthickness=0,
+            bg="white",
+        )
+        self.histogram_canvas.pack(side="top")
+        self.threshold_scale = tk.Scale(
+            self.threshold_frame,
+            from_=self.THRESHOLD_RANGE[0],
+            to=self.THRESHOLD_RANGE[1],
+            resolution=0.005,
+            orient="horizontal",
+            length=self.HISTOGRAM_WIDTH,
+            variable=self.threshold_var,
+            command=self.on_threshold_change,
+            state="disabled",
+        )
+        self.threshold_scale.pack(side="top")
+
         self.log_text = tk.Text(
             self.right_frame, width=30, height=20, bg="white", fg="black"
         )
@@ -239,6 +305,7 @@ class ImageCropper:
         self.crop_button.config(text=self.text[lang]["crop_button"])
         self.split_button.config(text=self.text[lang]["split_button"])
         self.process_button.config(text=self.text[lang]["process_button"])
+        self.threshold_label.config(text=self.text[lang]["threshold_label"])
         # 找到日志标签并更新文本
         for widget in self.right_frame.winfo_children():
             if isinstance(widget, tk.Label):
@@ -266,7 +333,7 @@ class ImageCropper:
                 "open": "normal",
                 "crop": "disabled",
                 "split": "normal",
-                "process": "disabled",
+                "process": "normal",  # 不选择特征区域时自动检测纯色间隔
             },
             "split": {
                 "open": "normal",
@@ -279,7 +346,13 @@ class ImageCropper:
         self.open_button.config(state=states[state]["open"])
         self.crop_button.config(state=states[state]["crop"])
         self.split_button.config(state=states[state]["split"])
-        self.process_button.config(state=states[state]["process"])
+        self.process_button.config(
+            state=(
+                "disabled"
+                if self.computing_selection is not None
+                else states[state]["process"]
+            )
+        )
 
     def open_image(self):
         file_path = filedialog.askopenfilename(
@@ -292,7 +365,7 @@ class ImageCropper:
                 self.text[self.current_language]["msg_loading_image"].format(file_path)
             )
             # 处理图片
-            preview_image, image_info = self.processor.load_image(file_path)
+            _, image_info = self.processor.load_image(file_path)
             self.log_message(
                 self.text[self.current_language]["msg_image_loaded"].format(
                     image_info.width, image_info.height
@@ -304,10 +377,22 @@ class ImageCropper:
             max_height = int(screen_height * 0.8)
             new_height = min(image_info.preview_height, max_height)
 
-            # 显示图片
-            self.photo = ImageTk.PhotoImage(preview_image)
-            self.canvas.config(width=image_info.preview_width, height=new_height)
-            self.canvas.create_image(0, 0, anchor="nw", image=self.photo)
+            # 显示图片：滚动区域为整幅图片，只绘制可见的图块
+            self.canvas.delete("all")
+            self.tile_items = {}
+            self.rect = None
+            self.canvas.config(
+                width=image_info.preview_width,
+                height=new_height,
+                scrollregion=(
+                    0,
+                    0,
+                    image_info.preview_width,
+                    image_info.preview_height,
+                ),
+            )
+            self.canvas.yview_moveto(0)
+            self.render_visible_tiles()
 
             # 更新左侧框架的高度
             self.left_frame.config(height=new_height)
@@ -322,6 +407,7 @@ class ImageCropper:
             # 重置选择状态
             self.selection = None
             self.vertical_selection = None
+            self.reset_threshold_view()
             if self.rect:
                 self.canvas.delete(self.rect)
                 self.rect = None
@@ -330,13 +416,19 @@ class ImageCropper:
             self.update_button_states("opened")
 
     def crop_width(self):
-        if self.processor.original_image:
+        if self.processor.image:
             if self.selection:
                 # 使用用户选择的宽度
                 start_x, end_x = self.selection
             else:
-                # 使用图片的默认宽度
-                start_x, end_x = 0, self.processor.original_image.width
+                # 未框选时自动检测内容区域
+                start_x, end_x = detect_width_range(self.processor.image.pixels)
+                self.selection = (start_x, end_x)
+                self.log_message(
+                    self.text[self.current_language]["msg_auto_width"].format(
+                        self.selection
+                    )
+                )
 
             # 清除选择框
             if self.rect:
@@ -364,18 +456,20 @@ class ImageCropper:
         self.update_button_states("split")
 
     def start_process_image(self):
-        """启动图片处理线程"""
-        if not all([self.selection, self.vertical_selection]):
-            logger.warning("未选择裁剪宽度或特征区域")
+        """启动图片处理线程（未选择特征区域时自动检测纯色间隔）"""
+        if not self.selection:
+            logger.warning("未选择裁剪宽度")
             messagebox.showwarning(
-                "警告", self.text[self.current_language]["warn_select_both"]
+                "警告", self.text[self.current_language]["warn_select_width"]
             )
             return
 
-        # 创建并启动线程
-        threading.Thread(target=self._process_image_in_thread).start()
+        # 创建并启动线程（在主线程中读取阈值）
+        threading.Thread(
+            target=self._process_image_in_thread, args=(self.threshold_var.get(),)
+        ).start()
 
-    def _process_image_in_thread(self):
+    def _process_image_in_thread(self, threshold: float):
         """在线程中处理图片"""
         self.root.config(cursor="wait")  # 设置鼠标为等待状态
 
@@ -383,27 +477,30 @@ class ImageCropper:
             logger.info("开始处理图片")
             self.log_message(self.text[self.current_language]["msg_processing_started"])
 
-            # 获取分割区域
-            start_y, end_y = self.vertical_selection
+            if self.vertical_selection:
+                # 获取分割区域
+                start_y, end_y = self.vertical_selection
 
-            # 计算分割点
-            self.processor.process_image(start_y, end_y)
-            self.split_points = self.processor.split_points
+                # 计算分割点
+                self.processor.process_image(start_y, end_y, self.selection, threshold)
+                self.split_points = self.processor.split_points
 
-            if not self.split_points:
-                messagebox.showwarning(
-                    "警告", self.text[self.current_language]["warn_no_split_points"]
-                )
-                return
+                if not self.split_points:
+                    messagebox.showwarning(
+                        "警告", self.text[self.current_language]["warn_no_split_points"]
+                    )
+                    return
 
-            self.log_message(
-                self.text[self.current_language]["msg_found_split_points"].format(
-                    len(self.split_points)
+                self.log_message(
+                    self.text[self.current_language]["msg_found_split_points"].format(
+                        len(self.split_points)
+                    )
                 )
-            )
+            else:
+                self.log_message(self.text[self.current_language]["msg_auto_detect"])
 
             # 获取原始图片路径
-            file_path = self.processor.original_image.filename
+            file_path = self.processor.image.path
             logger.debug(f"原始图片路径：{file_path}")
 
             # 创建分割器并处理
@@ -412,6 +509,10 @@ class ImageCropper:
                 width_range=self.selection,
                 feature_range=self.vertical_selection,
                 log_callback=self.log_message_from_thread,
+                image=self.processor.image,
+                match_scores=self.processor.match_scores,
+                threshold=threshold,
+                detector="template" if self.vertical_selection else "projection",
             )
 
             pdf_path = splitter.process()
@@ -467,15 +568,50 @@ class ImageCropper:
                 self.text[self.current_language]["err_opening_folder"].format(str(e)),
             )
 
+    def on_canvas_scroll(self, *args):
+        """滚动条拖动后绘制新出现的图块"""
+        self.canvas.yview(*args)
+        self.render_visible_tiles()
+
+    def on_mouse_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.on_canvas_scroll("scroll", -3, "units")
+        else:
+            self.on_canvas_scroll("scroll", 3, "units")
+
+    def render_visible_tiles(self):
+        """只保留可见范围（上下各多一块）的图块，内存占用与图片高度无关"""
+        tiles = self.processor.tiles
+        if tiles is None:
+            return
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        visible = tiles.tile_range(top - tiles.tile_height, bottom + tiles.tile_height)
+
+        for index in list(self.tile_items):
+            if index not in visible:
+                item, _ = self.tile_items.pop(index)
+                self.canvas.delete(item)
+        for index in visible:
+            if index not in self.tile_items:
+                photo = ImageTk.PhotoImage(tiles.tile(index))
+                item = self.canvas.create_image(
+                    0, index * tiles.tile_height, anchor="nw", image=photo, tags="tile"
+                )
+                self.tile_items[index] = (item, photo)
+        # 图块始终位于选择框和分割线下方
+        self.canvas.tag_lower("tile")
+
     def on_press(self, event):
-        self.start_x = event.x
-        self.start_y = event.y  # 添加y坐标记录
+        self.start_x = self.canvas.canvasx(event.x)
+        self.start_y = self.canvas.canvasy(event.y)  # 添加y坐标记录
         if self.rect:
             self.canvas.delete(self.rect)
 
     def on_drag(self, event):
         if self.rect:
             self.canvas.delete(self.rect)
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
 
         preview_height = (
             self.processor.image_info.preview_height
@@ -489,7 +625,7 @@ class ImageCropper:
             self.rect = self.canvas.create_rectangle(
                 self.start_x,
                 0,
-                event.x,
+                x,
                 preview_height,
                 outline="red",
             )
@@ -500,20 +636,17 @@ class ImageCropper:
                 0,
                 self.start_y,
                 preview_width,
-                event.y,
+                y,
                 outline="blue",
             )
 
     def on_release(self, event):
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
         if self.processor.image_info:
             if self.crop_button["state"] == "normal":
                 # 垂直选择（宽度选择）
-                real_start_x = self.processor.get_real_coordinates(
-                    min(self.start_x, event.x)
-                )
-                real_end_x = self.processor.get_real_coordinates(
-                    max(self.start_x, event.x)
-                )
+                real_start_x = self.processor.get_real_coordinates(min(self.start_x, x))
+                real_end_x = self.processor.get_real_coordinates(max(self.start_x, x))
                 self.selection = (real_start_x, real_end_x)
                 self.log_message(
                     self.text[self.current_language]["msg_selected_width_range"].format(
@@ -522,18 +655,127 @@ class ImageCropper:
                 )
             elif self.split_button["state"] == "normal":
                 # 水平选择（分割选择）
-                real_start_y = self.processor.get_real_coordinates(
-                    min(self.start_y, event.y)
-                )
-                real_end_y = self.processor.get_real_coordinates(
-                    max(self.start_y, event.y)
-                )
+                real_start_y = self.processor.get_real_coordinates(min(self.start_y, y))
+                real_end_y = self.processor.get_real_coordinates(max(self.start_y, y))
                 self.vertical_selection = (real_start_y, real_end_y)
                 self.log_message(
                     self.text[self.current_language][
                         "msg_selected_feature_range"
                     ].format(self.vertical_selection)
                 )
+                self.start_score_computation()
+
+    def start_score_computation(self):
+        """在后台线程中计算匹配得分，完成后由 process_score_queue 更新界面"""
+        self.reset_threshold_view()
+        selection = (self.selection, self.vertical_selection)
+        # 得分算好之前禁用处理按钮，避免处理线程重复执行同一次匹配
+        self.computing_selection = selection
+        self.process_button.config(state="disabled")
+        self.log_message(self.text[self.current_language]["msg_computing_scores"])
+        threading.Thread(
+            target=self._compute_scores_in_thread, args=(selection,), daemon=True
+        ).start()
+
+    def _compute_scores_in_thread(self, selection):
+        """在线程中计算匹配得分（只访问 processor，不访问界面）"""
+        width_range, (start_y, end_y) = selection
+        try:
+            self.processor.prepare_match_scores(start_y, end_y, width_range)
+            self.score_queue.put((selection, True))
+        except Exception as e:
+            logger.error(f"计算匹配得分时出错：{str(e)}")
+            self.score_queue.put((selection, False))
+
+    def process_score_queue(self):
+        """匹配得分计算完成后绘制直方图并启用阈值滑块"""
+        try:
+            while True:
+                selection, ok = self.score_queue.get_nowait()
+                if selection == self.computing_selection:
+                    # 最近一次计算已结束（失败时处理线程会重新匹配并报告错误）
+                    self.computing_selection = None
+                    self.process_button.config(state="normal")
+                # 计算期间选择已改变时忽略旧结果
+                if ok and selection == (self.selection, self.vertical_selection):
+                    self.draw_histogram()
+                    self.threshold_scale.config(state="normal")
+                    self.log_message(
+                        self.text[self.current_language]["msg_scores_ready"]
+                    )
+                    self.on_threshold_change()
+        except queue.Empty:
+            pass
+        self.root.after(100, self.process_score_queue)
+
+    def reset_threshold_view(self):
+        """清除直方图和分割线，禁用阈值滑块"""
+        self.histogram_canvas.delete("all")
+        self.canvas.delete("split_line")
+        self.threshold_scale.config(state="disabled")
+        self.threshold_label.config(
+            text=self.text[self.current_language]["threshold_label"]
+        )
+
+    def draw_histogram(self):
+        """绘制匹配得分的直方图（对数刻度，低分位置远多于分割点）"""
+        counts, _ = self.processor.score_histogram(
+            bins=self.HISTOGRAM_WIDTH // 4, value_range=self.THRESHOLD_RANGE
+        )
+        heights = np.log1p(counts)
+        if heights.max() > 0:
+            heights = heights / heights.max() * (self.HISTOGRAM_HEIGHT - 2)
+        bar_width = self.HISTOGRAM_WIDTH / len(counts)
+
+        self.histogram_canvas.delete("all")
+        for i, height in enumerate(heights):
+            if height > 0:
+                self.histogram_canvas.create_rectangle(
+                    i * bar_width,
+                    self.HISTOGRAM_HEIGHT - height,
+                    (i + 1) * bar_width,
+                    self.HISTOGRAM_HEIGHT,
+                    fill="#808080",
+                    outline="",
+                )
+
+    def on_threshold_change(self, _value=None):
+        """滑块移动时用缓存的匹配得分更新分割线，不重新匹配"""
+        if self.processor.match_scores is None:
+            return
+        threshold = self.threshold_var.get()
+
+        # 直方图上的阈值位置
+        low, high = self.THRESHOLD_RANGE
+        x = (threshold - low) / (high - low) * self.HISTOGRAM_WIDTH
+        self.histogram_canvas.delete("threshold_line")
+        self.histogram_canvas.create_line(
+            x, 0, x, self.HISTOGRAM_HEIGHT, fill="red", tags="threshold_line"
+        )
+
+        split_points = self.processor.split_points_at(threshold)
+        self.draw_split_overlay(split_points)
+        self.threshold_label.config(
+            text=self.text[self.current_language]["msg_threshold_points"].format(
+                threshold, len(split_points)
+            )
+        )
+
+    def draw_split_overlay(self, split_points):
+        """在预览图上画出分割点"""
+        self.canvas.delete("split_line")
+        image_info = self.processor.image_info
+        for point in split_points:
+            y = point * image_info.scale_ratio
+            self.canvas.create_line(
+                0,
+                y,
+                image_info.preview_width,
+                y,
+                fill="red",
+                dash=(4, 2),
+                tags="split_line",
+            )
 
     def log_message(self, message: str):
         """向日志区域和文件添加消息"""
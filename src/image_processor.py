@@ -1,8 +1,12 @@
-from PIL import Image
+import threading
+from concurrent.futures import Future
 from dataclasses import dataclass
 from typing import Tuple, Optional
-import cv2
 import numpy as np
+from src.match_cache import MatchCache
+from src.matching import compute_match_scores, pick_split_points
+from src.shared_image import SharedImage
+from src.tile_cache import TileCache
 
 
 @dataclass
@@ -15,68 +19,49 @@ class ImageInfo:
 
 
 class ImageProcessor:
-    PREVIEW_HEIGHT = 4000  # 预览时截取的高度
     DISPLAY_WIDTH = 800  # 显示最大宽度
-    DISPLAY_HEIGHT = 900  # 显示最大高度
 
-    def __init__(self):
-        self.image = None
+    def __init__(self, match_cache: Optional[MatchCache] = None):
+        self.match_cache = match_cache  # 跨会话复用的匹配得分缓存
+        self.image: Optional[SharedImage] = None  # 解码一次后共享给 ImageSplitter
         self.split_points = None
-        self.original_image: Optional[Image.Image] = None
-        self.preview_image: Optional[Image.Image] = None
+        self.match_scores: Optional[np.ndarray] = None  # 缓存的一维匹配得分
+        # 匹配得分对应的 (图片代数, width_range, feature_range, method)
+        self.match_range = None
+        self.tiles: Optional[TileCache] = None  # 整幅图片的预览图块
         self.image_info: Optional[ImageInfo] = None
-
-    def load_image(self, file_path: str) -> Tuple[Image.Image, ImageInfo]:
-        """加载并处理图片"""
-        # 加载原始图片
-        self.original_image = Image.open(file_path)
-
-        # 截取顶部预览部分
-        self.preview_image = self.original_image.crop(
-            (
-                0,
-                0,
-                self.original_image.width,
-                min(self.PREVIEW_HEIGHT, self.original_image.height),
-            )
-        )
-
-        # 计算显示尺寸
-        preview_width = self.preview_image.width
-        preview_height = self.preview_image.height
-        scale_ratio = 1.0
-
-        # 计算缩放比例
-        width_ratio = (
-            self.DISPLAY_WIDTH / preview_width
-            if preview_width > self.DISPLAY_WIDTH
-            else 1.0
-        )
-        height_ratio = (
-            self.DISPLAY_HEIGHT / preview_height
-            if preview_height > self.DISPLAY_HEIGHT
-            else 1.0
-        )
-
-        # 使用较小的缩放比例，保持宽高比
-        if width_ratio < 1.0 or height_ratio < 1.0:
-            scale_ratio = min(width_ratio, height_ratio)
-            preview_width = int(preview_width * scale_ratio)
-            preview_height = int(preview_height * scale_ratio)
-            self.preview_image = self.preview_image.resize(
-                (preview_width, preview_height), Image.Resampling.LANCZOS
-            )
+        # 每加载一张图片加一，计算期间换了图片时丢弃旧图片的得分
+        self._generation = 0
+        # 正在计算的 (match_range, Future)：后台计算得分的线程和处理图片的线程
+        # 可能同时调用 prepare_match_scores，后调用的一方等待同一个结果
+        self._pending: Optional[Tuple[tuple, Future]] = None
+        # 只保护上述状态的读写，匹配本身在锁外进行，不会阻塞界面线程
+        self._match_lock = threading.Lock()
+
+    def load_image(self, file_path: str) -> Tuple[TileCache, ImageInfo]:
+        """加载图片，返回按需生成的预览图块和图片信息"""
+        # 加载原始图片（只解码一次）
+        image = SharedImage.load(file_path)
+        with self._match_lock:
+            self.image = image
+            self._generation += 1
+            self.match_scores = None
+            self.match_range = None
+            self._pending = None
+
+        # 整幅图片按显示宽度缩小，预览高度即缩小后的完整高度
+        self.tiles = TileCache(self.image, self.DISPLAY_WIDTH)
 
         # 创建图片信息对象
         self.image_info = ImageInfo(
-            width=self.original_image.width,
-            height=self.original_image.height,
-            preview_width=preview_width,
-            preview_height=preview_height,
-            scale_ratio=scale_ratio,
+            width=self.image.width,
+            height=self.image.height,
+            preview_width=self.tiles.display_width,
+            preview_height=self.tiles.display_height,
+            scale_ratio=self.tiles.scale_ratio,
         )
 
-        return self.preview_image, self.image_info
+        return self.tiles, self.image_info
 
     def get_real_coordinates(self, preview_coord: int) -> int:
         """将预览图上的坐标转换为原图坐标"""
@@ -84,56 +69,155 @@ class ImageProcessor:
             return int(preview_coord / self.image_info.scale_ratio)
         return preview_coord
 
-    def calculate_split_points(self, start_y: int, end_y: int) -> list[int]:
+    def calculate_split_points(
+        self,
+        start_y: int,
+        end_y: int,
+        width_range: Optional[Tuple[int, int]] = None,
+        threshold: float = 0.9,
+        method: str = "template",
+    ) -> list[int]:
         """
         根据用户选择的特征区域，在图片中寻找所有可能的分割点
 
+        匹配得分会缓存到 match_scores，供 ImageSplitter 直接复用。
+
         Args:
             start_y: 特征区域的起始y坐标
             end_y: 特征区域的结束y坐标
+            width_range: 宽度裁剪范围 (start_x, end_x)，默认使用全宽
+            threshold: 匹配阈值
+            method: 匹配方法，见 matching.MATCH_METHODS
 
         Returns:
             分割点y坐标列表
         """
-        # 将PIL图像转换为OpenCV格式
-        cv_image = cv2.cvtColor(np.array(self.original_image), cv2.COLOR_RGB2BGR)
-
-        # 提取特征模板
-        template_height = end_y - start_y
-        template = cv_image[start_y:end_y, :, :]
-
-        # 执行模板匹配
-        result = cv2.matchTemplate(cv_image, template, cv2.TM_CCOEFF_NORMED)
-
-        # 设置阈值，找到所有匹配点
-        threshold = 0.8
-        locations = np.where(result >= threshold)
-        split_points = locations[0].tolist()
-
-        # 对分割点进行过滤和排序
-        split_points = sorted(set(split_points))  # 去重并排序
-
-        # 添加最小间隔过滤
-        min_distance = 10  # 设置最小间隔
-        filtered_split_points = []
-        last_point = -min_distance
-        for point in split_points:
-            if point - last_point >= min_distance:
-                filtered_split_points.append(point)
-                last_point = point
+        self.prepare_match_scores(start_y, end_y, width_range, method)
+        return self.split_points_at(threshold)
+
+    def prepare_match_scores(
+        self,
+        start_y: int,
+        end_y: int,
+        width_range: Optional[Tuple[int, int]] = None,
+        method: str = "template",
+    ) -> np.ndarray:
+        """
+        计算并缓存特征区域的匹配得分（耗时，可在后台线程中调用）
 
-        return filtered_split_points
+        之后调整阈值只需调用 split_points_at，不会重新匹配。
+        计算期间加载了新图片时，返回的是旧图片的得分，但不会缓存。
+        """
+        with self._match_lock:
+            image = self.image
+            if width_range is None:
+                width_range = (0, image.width)
+            match_range = (self._generation, width_range, (start_y, end_y), method)
+            if self.match_range == match_range:
+                return self.match_scores
+            if self._pending is not None and self._pending[0] == match_range:
+                # 相同的匹配正在进行，等待它的结果（每个任务只计算一次）
+                future, owner = self._pending[1], False
+            else:
+                future, owner = Future(), True
+                self._pending = (match_range, future)
+        if not owner:
+            return future.result()
+
+        # 在裁剪后的视图上匹配，与 ImageSplitter 使用相同的输入
+        try:
+            scores = self._compute_match_scores(
+                image.path,
+                image.crop_width(width_range),
+                image.template(width_range, (start_y, end_y)),
+                width_range,
+                method,
+            )
+        except BaseException as e:
+            with self._match_lock:
+                self._finish_pending(future)
+            future.set_exception(e)
+            raise
+
+        # 只在交换结果时持有锁；图片已经更换时丢弃结果
+        with self._match_lock:
+            self._finish_pending(future)
+            if self._generation == match_range[0]:
+                self.match_scores, self.match_range = scores, match_range
+        future.set_result(scores)
+        return scores
+
+    def _finish_pending(self, future: Future):
+        """清除正在计算的记录（仅当它仍是 future 时，调用方持有锁）"""
+        if self._pending is not None and self._pending[1] is future:
+            self._pending = None
+
+    def split_points_at(self, threshold: float) -> list[int]:
+        """用缓存的匹配得分按阈值挑选分割点，与 ImageSplitter 的规则一致"""
+        with self._match_lock:
+            scores, match_range = self.match_scores, self.match_range
+        if scores is None:
+            return []
+        # 最小间隔为模板高度的一半
+        start_y, end_y = match_range[2]
+        min_distance = max(1, (end_y - start_y) // 2)
+        return pick_split_points(scores, threshold, min_distance)
+
+    def score_histogram(
+        self, bins: int = 50, value_range: Tuple[float, float] = (0.5, 1.0)
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """缓存的匹配得分在 value_range 内的直方图，返回 (计数, 区间边界)"""
+        with self._match_lock:
+            scores = self.match_scores
+        scores = scores[np.isfinite(scores)]
+        return np.histogram(scores, bins=bins, range=value_range)
+
+    def _compute_match_scores(
+        self,
+        image_path: str,
+        cropped_image: np.ndarray,
+        template: np.ndarray,
+        width_range: Tuple[int, int],
+        method: str,
+    ) -> np.ndarray:
+        """
+        计算匹配得分，与 ImageSplitter 共用磁盘缓存
 
-    def process_image(self, start_y: int, end_y: int):
+        图片路径由调用方在开始计算时读取：计算期间加载了新图片时，
+        缓存键仍对应实际匹配的图片。
+        """
+        if self.match_cache is None:
+            return compute_match_scores(cropped_image, template, method)
+
+        key = self.match_cache.key(image_path, width_range, [template], method)
+        cached = self.match_cache.get(key)
+        if cached is not None and cached.image_shape == cropped_image.shape:
+            return cached.scores[0]
+
+        scores = compute_match_scores(cropped_image, template, method)
+        self.match_cache.put(key, [scores], cropped_image.shape)
+        return scores
+
+    def process_image(
+        self,
+        start_y: int,
+        end_y: int,
+        width_range: Optional[Tuple[int, int]] = None,
+        threshold: float = 0.9,
+    ):
         """
         处理图片，计算分割点
 
         Args:
             start_y: 特征区域的起始y坐标
             end_y: 特征区域的结束y坐标
+            width_range: 宽度裁剪范围 (start_x, end_x)
+            threshold: 匹配阈值
         """
-        if self.original_image is None:
+        if self.image is None:
             raise ValueError("请先加载图片")
 
         # 计算分割点
-        self.split_points = self.calculate_split_points(start_y, end_y)
+        self.split_points = self.calculate_split_points(
+            start_y, end_y, width_range, threshold
+        )
@@ -1,31 +1,131 @@
+import itertools
 import os
+import shutil
+import time
+import uuid
+from collections import deque
+from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
 from PIL import Image
 from pathlib import Path
-from typing import Tuple, List
+from typing import Dict, Iterator, NamedTuple, Tuple, List, Optional
 from loguru import logger
 from src.pdf_generator import PDFGenerator  # 添加导入
+from src.dedup import PageDeduplicator
+from src.incremental import (
+    ROW_HASHES_NAME,
+    load_row_hashes,
+    row_hashes,
+    settings_fingerprint,
+    shared_prefix,
+    stable_slices,
+)
+from src.job_manifest import JobManifest, SliceRecord
+from src.match_cache import MatchCache
+from src.matching import (
+    StreamingPeakPicker,
+    combine_match_scores,
+    compute_multi_match_scores,
+    pick_split_points,
+)
+from src.pdf_writer import EncodedImage
+from src.projection import GapDetector, detect_width_range, gap_split_points
+from src.shared_image import SharedImage
+from src.strip_source import (
+    ArrayStripSource,
+    RowBuffer,
+    StripSource,
+    open_strip_source,
+)
+
+# 分割点检测方式："template" 为特征模板匹配，"projection" 为无需模板的纯色间隔检测
+DETECTORS = ("template", "projection")
+
+
+class PageSlice(NamedTuple):
+    """一张分割后的图片及其在裁剪后图片中的位置"""
+
+    index: int
+    image: np.ndarray
+    start_y: int  # 图片顶部所在的行（已去除模板）
+    progress: float  # 进度值在 0 到 1 之间
+    template: Optional[int] = None  # 产生顶部分割点的模板序号，第一张为 None
 
 
 class ImageSplitter:
     def __init__(
         self,
         image_path: str,
-        width_range: Tuple[int, int],
-        feature_range: Tuple[int, int],
+        width_range: Optional[Tuple[int, int]],
+        feature_range: Optional[Tuple[int, int]],
         progress_callback=None,
         log_callback=None,
+        image: Optional[SharedImage] = None,
+        match_scores: Optional[np.ndarray] = None,
+        threshold: float = 0.9,
+        match_method: str = "template",
+        match_options: Optional[dict] = None,
+        streaming: bool = False,
+        strip_height: int = 4096,
+        encode_workers: Optional[int] = None,
+        save_images: bool = True,
+        slice_format: str = "png",
+        jpeg_quality: int = 90,
+        output_dir: str = "output",
+        template: Optional[np.ndarray] = None,
+        job_id: Optional[str] = None,
+        templates: Optional[List[np.ndarray]] = None,
+        template_options: Optional[List[dict]] = None,
+        detector: str = "template",
+        detector_options: Optional[dict] = None,
+        match_cache: Optional[MatchCache] = None,
+        strip_source: Optional[StripSource] = None,
+        dedup_distance: Optional[int] = None,
+        previous_job: Optional[str] = None,
     ):
         """
         初始化图片分割器
 
         Args:
             image_path: 原始图片路径
-            width_range: 宽度裁剪范围 (start_x, end_x)
-            feature_range: 特征区域范围 (start_y, end_y)
+            width_range: 宽度裁剪范围 (start_x, end_x)，为 None 时自动检测内容区域
+            feature_range: 特征区域范围 (start_y, end_y)，传入 template 时可为 None
             progress_callback: 进度回调函数
             log_callback: 日志回调函数
+            image: 已解码的共享图片，传入后不再重复读取文件
+            match_scores: ImageProcessor 缓存的一维匹配得分，传入后跳过重复匹配
+            threshold: 匹配阈值
+            match_method: 匹配方法，"template" 为二维模板匹配，"signature" 为行签名一维匹配，
+                "pyramid" 为由粗到细的金字塔匹配，"predictive" 按页面周期只扫描预测位置附近
+            match_options: 传给匹配方法的参数，
+                如 {"columns": 64} 或 {"scale": 0.25, "radius": 4}
+            streaming: 流式模式，按条带解码和匹配，内存占用与图片高度无关
+            strip_height: 流式模式下每个条带的行数
+            encode_workers: 并行编码分割图片的线程数，默认使用 CPU 核心数
+            save_images: 是否把分割图片保存到磁盘，PDF 始终直接使用内存中的图片
+            slice_format: 分割图片的编码格式，"png" 或 "jpeg"（适合照片较多的文档）
+            jpeg_quality: JPEG 编码质量 (0-100)
+            output_dir: 输出根目录，每个任务在其下使用独立的 "<源文件名>-<任务ID>" 目录，
+                包含 images 目录、PDF 和 manifest.json
+            template: 预先保存的特征模板（BGR 数组），传入后不再从图片中截取
+            job_id: 任务ID，默认由时间戳和随机串生成
+            templates: 额外的特征模板（不同样式的分割线），与主模板在同一次匹配中一起查找，
+                每个位置取得分最高的模板
+            template_options: templates 中每个模板单独的匹配参数（如缓存的 stats），
+                与 templates 一一对应；主模板（特征区域或 template）不使用单独的参数
+            detector: 分割点检测方式，"template" 为特征模板匹配；
+                "projection" 检测页面之间的纯色间隔，不需要特征区域和模板
+            detector_options: 传给 GapDetector 的参数，
+                如 {"min_height": 10, "tolerance": 8, "gap_color": (200, 200, 200)}
+            match_cache: 磁盘上的匹配得分缓存，同一张图片重复处理时跳过模板匹配
+                （流式模式逐条带匹配，不使用缓存）
+            strip_source: 自定义的条带数据源（如 StitchedSource 拼接的虚拟长图），
+                传入后以流式模式处理，image_path 只用于命名任务
+            dedup_distance: 去除重复页面的最大感知哈希距离（共 256 位），默认不去重
+            previous_job: 同一文档上次处理的任务目录。新截图只是在底部延长时，
+                沿用公共前缀内的图片，只匹配和编码新增的部分（仅非流式模式）
         """
         logger.debug(f"初始化 ImageSplitter: {image_path}")
         self.image_path = image_path
@@ -33,19 +133,83 @@ class ImageSplitter:
         self.feature_range = feature_range
         self.progress_callback = progress_callback
         self.log_callback = log_callback
-
-        # 分离图片和PDF输出目录
-        self.output_dir = Path("output/images")
-        self.pdf_dir = Path("output/pdf")
-
-        # 创建输出目录
-        self.output_dir.mkdir(parents=True, exist_ok=True)
-        self.pdf_dir.mkdir(parents=True, exist_ok=True)
+        self.image = image
+        self.match_scores = match_scores
+        self.threshold = threshold
+        self.match_method = match_method
+        self.match_options = dict(match_options or {})
+        if match_method == "predictive":
+            # 预测时判定分割点的阈值默认与最终阈值一致
+            self.match_options.setdefault("threshold", threshold)
+        self.strip_source = strip_source
+        # 自定义数据源没有对应的图片文件，只能流式处理
+        self.streaming = streaming or strip_source is not None
+        self.strip_height = strip_height
+        self.encode_workers = encode_workers or os.cpu_count() or 1
+        self.save_images = save_images
+        if slice_format not in ("png", "jpeg"):
+            raise ValueError(f"不支持的图片格式: {slice_format}")
+        self.slice_format = slice_format
+        self.jpeg_quality = jpeg_quality
+        self.template = template
+        self.extra_templates = list(templates or [])
+        self.extra_template_options = list(
+            template_options or [{} for _ in self.extra_templates]
+        )
+        if len(self.extra_template_options) != len(self.extra_templates):
+            raise ValueError("template_options 必须与 templates 一一对应")
+        # 与参与匹配的全部模板一一对应，提取模板后补上主模板的参数
+        self.template_options = list(self.extra_template_options)
+        if detector not in DETECTORS:
+            raise ValueError(f"未知的检测方式: {detector}")
+        self.detector = detector
+        self.detector_options = detector_options or {}
+        self.match_cache = match_cache
+        self.dedup_distance = dedup_distance
+        self.previous_job = Path(previous_job) if previous_job else None
+        self.previous_manifest: Optional[JobManifest] = None
+        if self.previous_job is not None:
+            self.previous_manifest = JobManifest.load(self.previous_job)
+            if width_range is None:
+                # 沿用上次的宽度范围，避免自动检测的结果不同导致无法比较
+                width_range = self.previous_manifest.width_range
+                self.width_range = width_range
+        has_primary = template is not None or feature_range is not None
+        if detector == "template" and not has_primary and not self.extra_templates:
+            raise ValueError("必须指定特征区域或特征模板")
 
         # 获取源文件名（不含扩展名）
         self.source_name = Path(image_path).stem
 
-        self.template_height = 0  # 初始化模板高度
+        # 每个任务使用独立目录，先写入 .staging 下的临时目录，完成后再整体改名，
+        # 并发任务和上次运行的残留文件不会混在一起
+        self.job_id = job_id or (
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        )
+        job_name = f"{self.source_name}-{self.job_id}"
+        self.job_dir = Path(output_dir) / job_name
+        self.staging_dir = Path(output_dir) / ".staging" / job_name
+        self.output_dir = self.staging_dir / "images"
+        self.pdf_dir = self.staging_dir
+
+        # 本次任务产生的分割图片记录
+        self.manifest = JobManifest(
+            job_id=self.job_id,
+            source=str(image_path),
+            width_range=tuple(width_range) if width_range else None,
+            feature_range=tuple(feature_range) if feature_range else None,
+            threshold=threshold,
+            match_method=match_method,
+            templates=len(self.extra_templates) + int(has_primary),
+            detector=detector,
+        )
+
+        self.template_heights: List[int] = []  # 各模板的高度
+        self.split_tags: Dict[int, int] = {}  # 分割点 -> 产生该分割点的模板序号
+        self.split_trims: Dict[int, int] = {}  # 分割点 -> 下一页顶部需要去除的行数
+        self.row_hashes: List[np.ndarray] = []  # 裁剪后每一行的哈希，供下次增量处理
+        # 使用模板时，提取模板后再计入模板
+        self.manifest.settings = self._settings_fingerprint([])
 
     def _log(self, message: str):
         """输出日志"""
@@ -54,81 +218,435 @@ class ImageSplitter:
         logger.info(message)
 
     def process(self):
-        """执行图片处理流程"""
+        """执行图片处理流程，成功后返回任务目录中的PDF路径"""
         logger.info("开始处理图片...")
         self._log("开始处理图片...")
 
-        # 1. 裁剪宽度
-        self._log("正在裁剪宽度...")
-        cropped_image = self._crop_width()
+        if self.job_dir.exists():
+            raise FileExistsError(f"任务目录已存在: {self.job_dir}")
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            pdf_path = self._process()
+        except BaseException:
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+            raise
+        return self._finalize(pdf_path)
+
+    def _process(self) -> Optional[Path]:
+        """在临时目录中完成分割和PDF生成"""
+        reused: List[SliceRecord] = []
+        if self.streaming:
+            slices = self._prepare_streaming()
+        else:
+            # 1. 裁剪宽度
+            self._log("正在裁剪宽度...")
+            cropped_image = self._crop_width()
+            self.row_hashes.append(row_hashes(cropped_image))
+
+            if self.detector == "template":
+                # 2. 提取特征模板（特征区域按整幅图片的坐标截取）
+                self._log("正在提取特征模板...")
+                templates = self._extract_templates(cropped_image)
+
+            # 增量处理：沿用上次任务中公共前缀内的图片，只处理新增的部分
+            reused = self._plan_reuse() if self.previous_manifest else []
+            tail_start = (
+                self.previous_manifest.slices[len(reused)].start_y if reused else 0
+            )
+            image = cropped_image[tail_start:]
+
+            if self.detector == "projection":
+                # 2. 无需模板，直接检测页面之间的纯色间隔
+                self._log("正在检测页面间隔...")
+                split_points = self._find_gap_split_points(image)
+            else:
+                # 3. 寻找分割点
+                self._log("正在寻找分割点...")
+                split_points = self._find_split_points(image, templates)
+            slices = self._iter_slices(image, split_points)
+            if reused:
+                slices = (
+                    page._replace(start_y=page.start_y + tail_start) for page in slices
+                )
+
+        if self.dedup_distance is not None:
+            # 编码之前去除重复页面，不浪费编码时间和PDF体积
+            slices = self._dedup_slices(slices)
+
+        # 4. 根据分割点切分图片，按需保存，并直接用内存中的图片生成PDF
+        if self.save_images:
+            self._log("开始保存分割后的图片并生成PDF...")
+        else:
+            self._log("正在生成PDF...")
+        if reused:
+            # 新增的图片编号接在沿用的图片后面
+            slices = (page._replace(index=page.index + len(reused)) for page in slices)
+        encoded = self._save_slices(slices)
+        if reused:
+            # 沿用的图片直接使用上次编码的数据
+            encoded = itertools.chain(self._reuse_slices(reused), encoded)
+        pdf_gen = PDFGenerator(None, self.pdf_dir)
+        pdf_path = pdf_gen.generate(
+            self.pdf_dir / f"{self.source_name}.pdf", slices=encoded
+        )
+        self._log("图片分割完成！")
+        stats = pdf_gen.stats
+        self._log(
+            f"PDF生成完成！共 {stats['pages']} 页，"
+            f"{stats['size'] / 1024 / 1024:.2f} MB，用时 {stats['seconds']:.2f} 秒"
+        )
 
-        # 2. 提取特征模板
-        self._log("正在提取特征模板...")
-        template = self._extract_template(cropped_image)
-        self.template_height = template.shape[0]  # 保存模板高度
+        return pdf_path  # 返回生成的PDF路径
 
-        # 3. 寻找分割点
-        self._log("正在寻找分割点...")
-        split_points = self._find_split_points(cropped_image, template)
+    def _finalize(self, pdf_path: Optional[Path]) -> Optional[Path]:
+        """写入 manifest.json，再把临时目录整体改名为任务目录"""
+        if pdf_path is not None:
+            self.manifest.pdf = Path(pdf_path).name
+        if self.row_hashes:
+            np.save(self.staging_dir / ROW_HASHES_NAME, np.concatenate(self.row_hashes))
+        self.manifest.save(self.staging_dir)
+
+        self.job_dir.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.staging_dir, self.job_dir)
+        self.output_dir = self.job_dir / "images"
+        self.pdf_dir = self.job_dir
+        self._log(f"输出目录: {self.job_dir}")
+
+        return self.job_dir / self.manifest.pdf if pdf_path is not None else None
+
+    def _prepare_streaming(self) -> Iterator[PageSlice]:
+        """流式处理：逐条带匹配，每找到一个分割点就立即交出对应页面"""
+        self._log(f"正在以流式模式处理图片，条带高度 {self.strip_height} 行...")
+        source = self._open_strip_source()
+        buffer = RowBuffer()
+        if self.width_range is None:
+            # 流式模式下只用顶部的一个条带检测宽度，避免额外读取整幅图片
+            self._detect_width_range(
+                self.image.pixels
+                if self.image is not None
+                else source.read(0, min(source.height, self.strip_height))
+            )
+
+        if self.detector == "projection":
+            split_points = self._iter_gap_split_points_streaming(source, buffer)
+            return self._iter_pages_streaming(source, split_points, buffer)
+
+        templates = list(self.extra_templates)
+        if self.template is not None:
+            templates.insert(0, self.template)
+        elif self.feature_range is not None:
+            # 特征区域通常位于顶部，单独读取一次
+            start_x, end_x = self.width_range
+            start_y, end_y = self.feature_range
+            templates.insert(
+                0,
+                np.ascontiguousarray(source.read(start_y, end_y)[:, start_x:end_x]),
+            )
+        self._use_templates(templates)
+
+        split_points = self._iter_split_points_streaming(source, templates, buffer)
+        return self._iter_pages_streaming(source, split_points, buffer)
+
+    def _iter_pages_streaming(
+        self, source: StripSource, split_points: Iterator[int], buffer: RowBuffer
+    ) -> Iterator[PageSlice]:
+        """逐个生成流式模式下的页面"""
+        page_start = next(split_points)
+        for i, page_end in enumerate(split_points):
+            # 生成器在此暂停，交出当前页面后才继续读取后续条带
+            page = buffer.take(page_start, page_end)
+            top = page_start
+            if i > 0:  # 第一张图片不需要去除顶部
+                page = page[self._trim_height(page_start) :]
+                top += self._trim_height(page_start)
+            yield PageSlice(
+                i,
+                page,
+                top,
+                page_end / source.height,
+                self.split_tags.get(page_start) if i > 0 else None,
+            )
+            buffer.discard_before(page_end)
+            page_start = page_end
+
+    def _open_strip_source(self) -> StripSource:
+        """打开条带数据源，优先使用传入的数据源或已有的共享图片"""
+        if self.strip_source is not None:
+            return self.strip_source
+        if self.image is not None:
+            return ArrayStripSource(self.image.pixels)
+        return open_strip_source(self.image_path)
+
+    def _iter_split_points_streaming(
+        self, source: StripSource, templates: List[np.ndarray], buffer: RowBuffer
+    ) -> Iterator[int]:
+        """
+        逐条带寻找分割点
 
-        # 4. 根据分割点切分图片并保存
-        self._log(f"开始保存分割后的图片...")
-        self._split_and_save(cropped_image, split_points)
-        self._log("图片分割完成！")
+        每个窗口只处理所有模板都能完整放下的位置，剩余的 (最高模板高度 - 1) 行
+        留给下一个窗口，保证每个匹配位置恰好被计算一次。
+        跨越窗口边界的峰值簇由 StreamingPeakPicker 暂存，结果与整图处理一致。
+        读入的条带会追加到 buffer 中，供调用方拼出页面。
+        """
+        start_x, end_x = self.width_range
+        max_height = max(self.template_heights)
+        picker = StreamingPeakPicker(self.threshold, self._min_distance(), start=0)
 
-        # 生成PDF
-        self._log("正在生成PDF...")
-        pdf_gen = PDFGenerator(self.output_dir, self.pdf_dir)
-        pdf_path = pdf_gen.generate()
-        self._log("PDF生成完成！")
+        # 添加起始点
+        last_point = 0
+        yield last_point
+
+        window = None  # 尚未处理完的行
+        window_start = 0  # window 第一行所在的行号
+        for _, strip in source.iter_strips(self.strip_height):
+            strip = strip[:, start_x:end_x]
+            buffer.append(strip)
+            self.row_hashes.append(row_hashes(strip))
+
+            window = strip if window is None else np.concatenate([window, strip])
+            count = window.shape[0] - max_height + 1
+            if count <= 0:
+                continue
+            for point in self._match_window(
+                window, templates, count, window_start, picker
+            ):
+                last_point = point
+                yield last_point
+            window = window[count:].copy()
+            window_start += count
+
+        # 图片末尾：较矮的模板还能匹配剩余的位置
+        if window is not None and window.shape[0] >= min(self.template_heights):
+            count = window.shape[0] - min(self.template_heights) + 1
+            for point in self._match_window(
+                window, templates, count, window_start, picker
+            ):
+                last_point = point
+                yield last_point
+        for point in self._record_points(picker.finish()):
+            last_point = point
+            yield last_point
+        self._log_scanned()
 
-        return pdf_path  # 返回生成的PDF路径
+        # 添加结束点
+        if last_point < source.height - self._trim_height(last_point):
+            yield source.height
 
-    def _crop_width(self) -> np.ndarray:
-        """裁剪图片宽度"""
-        # 读取原始图片
-        image = cv2.imread(self.image_path)
+    def _iter_gap_split_points_streaming(
+        self, source: StripSource, buffer: RowBuffer
+    ) -> Iterator[int]:
+        """逐条带检测纯色间隔，间隔结束后立即交出分割点"""
         start_x, end_x = self.width_range
+        detector = GapDetector(**self.detector_options)
+
+        yield 0
+        for _, strip in source.iter_strips(self.strip_height):
+            strip = strip[:, start_x:end_x]
+            buffer.append(strip)
+            self.row_hashes.append(row_hashes(strip))
+            for start, end in detector.feed(strip):
+                if start > 0:  # 贴着顶部的间隔不作为分割点
+                    self.split_trims[start] = end - start
+                    yield start
+        # 延续到底部的间隔不作为分割点
+        detector.finish()
+        yield source.height
+
+    def _match_window(
+        self,
+        window: np.ndarray,
+        templates: List[np.ndarray],
+        count: int,
+        offset: int,
+        picker: StreamingPeakPicker,
+    ) -> List[int]:
+        """在窗口的前 count 个位置中寻找分割点，返回已确定的分割点（全图坐标）"""
+        scores, tags = combine_match_scores(
+            compute_multi_match_scores(
+                window,
+                templates,
+                self.match_method,
+                self.template_options,
+                **self.match_options,
+            ),
+            count,
+        )
+        self._count_scanned(scores)
+        return self._record_points(picker.feed(scores, offset, tags))
+
+    def _count_scanned(self, scores: np.ndarray):
+        """统计实际计算过得分的位置（predictive 等方法跳过的位置为 NaN）"""
+        self.manifest.scanned_positions += int(np.count_nonzero(~np.isnan(scores)))
+        self.manifest.total_positions += len(scores)
+
+    def _log_scanned(self):
+        manifest = self.manifest
+        if manifest.total_positions:
+            logger.info(
+                f"实际匹配 {manifest.scanned_positions}/{manifest.total_positions} 个位置 "
+                f"({manifest.scanned_positions / manifest.total_positions:.1%})"
+            )
+
+    def _record_points(self, points: List[Tuple[int, int]]) -> List[int]:
+        """记录分割点对应的模板，返回分割点列表"""
+        for point, tag in points:
+            self.split_tags[point] = tag
+            self.split_trims[point] = self.template_heights[tag]
+        return [point for point, _ in points]
 
-        # 裁剪指定宽度
-        return image[:, start_x:end_x]
+    def _crop_width(self) -> np.ndarray:
+        """裁剪图片宽度（返回共享图片的零拷贝视图）"""
+        # 未传入共享图片时才读取原始图片
+        if self.image is None:
+            self.image = SharedImage.load(self.image_path)
+
+        if self.width_range is None:
+            self._detect_width_range(self.image.pixels)
 
-    def _extract_template(self, image: np.ndarray) -> np.ndarray:
-        """提取特征模板"""
-        start_y, end_y = self.feature_range
-        return image[start_y:end_y, :]
+        # 裁剪指定宽度
+        return self.image.crop_width(self.width_range)
+
+    def _detect_width_range(self, image: np.ndarray):
+        """自动检测内容区域的宽度范围"""
+        self.width_range = detect_width_range(image)
+        self.manifest.width_range = self.width_range
+        self.manifest.settings = self._settings_fingerprint([])
+        self._log(f"自动检测的宽度范围: {self.width_range}")
+
+    def _extract_templates(self, image: np.ndarray) -> List[np.ndarray]:
+        """提取特征模板：主模板（特征区域或传入的模板）在前，额外模板在后"""
+        templates = list(self.extra_templates)
+        if self.template is not None:
+            templates.insert(0, self.template)
+        elif self.feature_range is not None:
+            start_y, end_y = self.feature_range
+            templates.insert(0, image[start_y:end_y, :])
+        self._use_templates(templates)
+        return templates
+
+    def _use_templates(self, templates: List[np.ndarray]):
+        """记录各模板的高度和匹配参数，并把模板计入参数指纹"""
+        self.template_heights = [t.shape[0] for t in templates]
+        primary = len(templates) - len(self.extra_templates)
+        self.template_options = [{}] * primary + self.extra_template_options
+        self.manifest.settings = self._settings_fingerprint(templates)
+
+    def _settings_fingerprint(self, templates: List[np.ndarray]) -> str:
+        """本次任务中影响分割和编码结果的参数指纹"""
+        return settings_fingerprint(
+            templates,
+            {
+                "width_range": self.manifest.width_range,
+                "feature_range": self.manifest.feature_range,
+                "threshold": self.threshold,
+                "match_method": self.match_method,
+                "match_options": self.match_options,
+                "template_options": self.extra_template_options,
+                "detector": self.detector,
+                "detector_options": self.detector_options,
+                "slice_format": self.slice_format,
+                "jpeg_quality": (
+                    self.jpeg_quality if self.slice_format == "jpeg" else None
+                ),
+                "dedup_distance": self.dedup_distance,
+            },
+        )
+
+    def _min_distance(self) -> int:
+        """相邻分割点的最小间距"""
+        return max(1, min(self.template_heights) // 2)
+
+    def _trim_height(self, split_point: int) -> int:
+        """分割点下方图片顶部需要去除的行数（模板高度或间隔高度）"""
+        if split_point in self.split_trims:
+            return self.split_trims[split_point]
+        return self.template_heights[0] if self.template_heights else 0
+
+    def _find_gap_split_points(self, image: np.ndarray) -> List[int]:
+        """不使用模板，根据纯色间隔找到所有分割点"""
+        gaps = GapDetector(**self.detector_options).detect(image)
+        split_points, self.split_trims = gap_split_points(gaps, image.shape[0])
+        return split_points
 
-    def _find_split_points(self, image: np.ndarray, template: np.ndarray) -> List[int]:
+    def _find_split_points(
+        self, image: np.ndarray, templates: List[np.ndarray]
+    ) -> List[int]:
         """
         使用模板匹配找到所有分割点
-        """
-        # 执行模板匹配
-        result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
-
-        # 设置阈值，找到所有匹配点
-        threshold = 0.9
-        locations = np.where(result >= threshold)[0]
 
-        # 过滤和处理分割点
-        split_points = []
-        min_distance = template.shape[0] // 2  # 最小间距
-
-        # 添加起始点
-        split_points.append(0)
-
-        # 过滤太近的点
-        for loc in locations:
-            if not split_points or loc - split_points[-1] >= min_distance:
-                split_points.append(loc)
+        多个模板共用一次匹配，每个位置取得分最高的模板，
+        分割点对应的模板序号记录在 split_tags 中。
+        """
+        # 优先复用缓存的匹配得分（只有一个模板时），尺寸不符时才重新匹配
+        scores = self.match_scores
+        if (
+            len(templates) > 1
+            or scores is None
+            or len(scores) != image.shape[0] - templates[0].shape[0] + 1
+        ):
+            scores, tags = combine_match_scores(
+                self._compute_match_scores(image, templates)
+            )
+            self.match_scores = scores
+        else:
+            tags = np.zeros(len(scores), dtype=np.intp)
+        self._count_scanned(scores)
+        self._log_scanned()
+
+        # 添加起始点，并过滤太近的点
+        split_points = [0]
+        for point in pick_split_points(
+            scores, self.threshold, self._min_distance(), start=0
+        ):
+            self.split_tags[point] = int(tags[point])
+            self.split_trims[point] = self.template_heights[int(tags[point])]
+            split_points.append(point)
 
         # 添加结束点
-        if split_points[-1] < image.shape[0] - template.shape[0]:
+        if split_points[-1] < image.shape[0] - self._trim_height(split_points[-1]):
             split_points.append(image.shape[0])
 
         return split_points
 
-    def _split_and_save(self, image: np.ndarray, split_points: List[int]):
-        """根据分割点切分图片并保存"""
+    def _compute_match_scores(
+        self, image: np.ndarray, templates: List[np.ndarray]
+    ) -> List[np.ndarray]:
+        """计算每个模板的匹配得分，启用缓存时优先读取缓存"""
+        if self.match_cache is None:
+            return compute_multi_match_scores(
+                image,
+                templates,
+                self.match_method,
+                self.template_options,
+                **self.match_options,
+            )
+
+        key = self.match_cache.key(
+            self.image_path,
+            self.width_range,
+            templates,
+            self.match_method,
+            self.match_options,
+        )
+        cached = self.match_cache.get(key)
+        if cached is not None and cached.image_shape == image.shape:
+            self._log("使用缓存的匹配结果")
+            return cached.scores
+
+        scores = compute_multi_match_scores(
+            image,
+            templates,
+            self.match_method,
+            self.template_options,
+            **self.match_options,
+        )
+        self.match_cache.put(key, scores, image.shape)
+        return scores
+
+    def _iter_slices(
+        self, image: np.ndarray, split_points: List[int]
+    ) -> Iterator[PageSlice]:
+        """根据分割点逐个生成分割后的图片"""
         total_points = len(split_points) - 1
 
         for i in range(total_points):
@@ -140,18 +658,135 @@ class ImageSplitter:
 
             # 去除顶部的模板部分
             if i > 0:  # 第一张图片不需要去除顶部
-                cropped_image = cropped_image_with_template[self.template_height :]
+                trim = self._trim_height(start_y)
+                cropped_image = cropped_image_with_template[trim:]
+                start_y += trim
             else:
                 cropped_image = cropped_image_with_template
 
-            # 生成输出文件名
-            output_path = self.output_dir / f"{self.source_name}_{i+1}.png"
-
-            # 保存图片
-            cv2.imwrite(str(output_path), cropped_image)
+            progress = (i + 1) / total_points  # 进度值在 0 到 1 之间
+            tag = self.split_tags.get(split_points[i]) if i > 0 else None
+            yield PageSlice(i, cropped_image, start_y, progress, tag)
+
+    def _plan_reuse(self) -> List[SliceRecord]:
+        """比较行哈希，找出上次任务中可以沿用的图片"""
+        previous = self.previous_manifest
+        previous_rows = load_row_hashes(self.previous_job)
+        if previous_rows is None:
+            self._log("上次任务没有保存行哈希，完整处理")
+            return []
+        if previous.settings is None or previous.settings != self.manifest.settings:
+            self._log("参数与上次任务不同，完整处理")
+            return []
+
+        prefix = shared_prefix(previous_rows, self.row_hashes[0])
+        if self.detector == "template":
+            # 分割点所在的峰值簇和下一页顶部的模板都要在公共前缀内
+            margin = max(self.template_heights) + self._min_distance()
+        else:
+            margin = 1  # 间隔之后至少有一行不同的内容，间隔才不会延长
+        reused = stable_slices(previous, prefix, margin)
+        self.manifest.reused = len(reused)
+        self._log(
+            f"与上次任务的公共前缀 {prefix} 行，沿用 {len(reused)} 张图片，"
+            f"重新处理 {len(previous.slices) - len(reused)} 张之后的部分"
+        )
+        if reused:
+            # 只匹配新增的部分，得分与整幅图片不同，不写入匹配缓存
+            self.match_cache = None
+        return reused
+
+    def _reuse_slices(self, records: List[SliceRecord]) -> Iterator[EncodedImage]:
+        """复制上次任务的图片文件，直接交给PDF生成，不重新编码"""
+        for record in records:
+            data = (self.previous_job / record.file).read_bytes()
+            file = None
+            if self.save_images:
+                # 按本次任务的命名规则重新命名
+                suffix = Path(record.file).suffix
+                output_path = (
+                    self.output_dir / f"{self.source_name}_{record.index + 1}{suffix}"
+                )
+                output_path.write_bytes(data)
+                file = output_path.relative_to(self.staging_dir).as_posix()
+            self.manifest.slices.append(replace(record, file=file))
+            yield EncodedImage(data, record.format, record.width, record.height)
+
+    def _dedup_slices(self, slices: Iterator[PageSlice]) -> Iterator[PageSlice]:
+        """去除重复页面，结束后记录到 manifest 并输出汇总"""
+        deduplicator = PageDeduplicator(self.dedup_distance)
+        yield from deduplicator.filter(slices)
+        self.manifest.duplicates = deduplicator.removed
+        if deduplicator.removed:
+            self._log(f"已去除 {len(deduplicator.removed)} 张重复页面")
+
+    def _save_slices(self, slices: Iterator[PageSlice]) -> Iterator[EncodedImage]:
+        """
+        编码图片（按需保存到磁盘），并按顺序把编码结果交给下游（PDF 生成）
 
-            # 更新进度和日志
-            if self.progress_callback:
-                progress = (i + 1) / total_points  # 进度值在 0 到 1 之间
-                self.progress_callback(progress)
-            self._log(f"已保存: {output_path}")
+        每张图片只编码一次，磁盘文件和 PDF 使用同一份数据。
+        使用线程池并行编码：cv2.imencode 编码时会释放 GIL，多线程即可并行。
+        结果按提交顺序取回，日志和进度回调保持有序、单调递增；
+        同时在途的任务数有上限，避免流式模式下页面堆积在内存中。
+        """
+        max_pending = self.encode_workers * 2
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=self.encode_workers) as executor:
+            for page in slices:
+                future = executor.submit(self._save_slice, page.index, page.image)
+                pending.append((future, page))
+                if len(pending) >= max_pending:
+                    yield self._finish_slice(*pending.popleft())
+            while pending:
+                yield self._finish_slice(*pending.popleft())
+
+    def _finish_slice(self, future, page: PageSlice) -> EncodedImage:
+        """等待单张图片编码完成，记录到 manifest，并更新进度和日志"""
+        encoded, output_path = future.result()
+        self.manifest.slices.append(
+            SliceRecord(
+                index=page.index,
+                start_y=page.start_y,
+                end_y=page.start_y + encoded.height,
+                width=encoded.width,
+                height=encoded.height,
+                format=encoded.format,
+                template=page.template,
+                file=(
+                    output_path.relative_to(self.staging_dir).as_posix()
+                    if output_path is not None
+                    else None
+                ),
+            )
+        )
+        if self.progress_callback:
+            self.progress_callback(page.progress)
+        if output_path is not None:
+            self._log(f"已保存: {output_path.name}")
+        return encoded
+
+    def _save_slice(
+        self, index: int, image: np.ndarray
+    ) -> Tuple[EncodedImage, Optional[Path]]:
+        """编码单张分割图片并按需保存（在工作线程中执行）"""
+        if self.slice_format == "jpeg":
+            extension = ".jpg"
+            params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        else:
+            extension = ".png"
+            params = []
+        ok, buffer = cv2.imencode(extension, image, params)
+        if not ok:
+            raise ValueError(f"图片编码失败: 第 {index+1} 张")
+        encoded = EncodedImage(
+            buffer.tobytes(), self.slice_format, image.shape[1], image.shape[0]
+        )
+
+        if not self.save_images:
+            return encoded, None
+
+        # 生成输出文件名并保存
+        output_path = self.output_dir / f"{self.source_name}_{index+1}{extension}"
+        output_path.write_bytes(encoded.data)
+        return encoded, output_path
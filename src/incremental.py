@@ -0,0 +1,62 @@
+import hashlib
+import json
+import zlib
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+from src.job_manifest import JobManifest, SliceRecord
+
+# 任务目录中保存每行哈希的文件，供下次增量处理比较
+ROW_HASHES_NAME = "rows.npy"
+
+
+def row_hashes(image: np.ndarray) -> np.ndarray:
+    """每一行像素的 CRC32（跨进程稳定，可以保存到磁盘）"""
+    return np.fromiter(
+        (zlib.crc32(row.tobytes()) for row in image), dtype=np.uint32, count=len(image)
+    )
+
+
+def shared_prefix(previous: np.ndarray, current: np.ndarray) -> int:
+    """两组行哈希的公共前缀行数"""
+    length = min(len(previous), len(current))
+    different = np.flatnonzero(previous[:length] != current[:length])
+    return int(different[0]) if different.size else length
+
+
+def load_row_hashes(job_dir: Path) -> Optional[np.ndarray]:
+    """读取任务目录中保存的行哈希，没有时返回 None"""
+    path = Path(job_dir) / ROW_HASHES_NAME
+    return np.load(path) if path.is_file() else None
+
+
+def settings_fingerprint(templates: List[np.ndarray], params: dict) -> str:
+    """
+    影响分割和编码结果的全部参数的哈希，保存在 manifest 中
+
+    两次任务的指纹相同，公共前缀内的图片才能沿用。
+    params 中无法序列化的值（如预先计算的统计量）由模板决定，不参与哈希。
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(params, sort_keys=True, default=lambda _: None).encode())
+    for template in templates:
+        digest.update(repr((template.shape, template.dtype.str)).encode())
+        digest.update(np.ascontiguousarray(template).tobytes())
+    return digest.hexdigest()
+
+
+def stable_slices(manifest: JobManifest, prefix: int, margin: int) -> List[SliceRecord]:
+    """
+    上次任务中不受新内容影响、可以直接沿用的图片
+
+    一张图片可以沿用，需要它下方的分割点在新图片中仍会以相同方式找到：
+    下一张图片的起始行（分割点加上模板或间隔）再往下 margin 行都在公共前缀内。
+    最后一张图片延伸到旧图片底部，它下方没有分割点，总是需要重新处理。
+    只有保存了图片文件的记录才能沿用。
+    """
+    stable = []
+    for record, following in zip(manifest.slices, manifest.slices[1:]):
+        if record.file is None or following.start_y + margin > prefix:
+            break
+        stable.append(record)
+    return stable
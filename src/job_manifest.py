@@ -0,0 +1,75 @@
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+MANIFEST_NAME = "manifest.json"
+
+
+@dataclass
+class SliceRecord:
+    """一张分割图片的记录"""
+
+    index: int  # 页码，从 0 开始
+    start_y: int  # 在裁剪后图片中的起始行（已去除模板）
+    end_y: int  # 结束行（不含）
+    width: int
+    height: int
+    format: str  # "png" 或 "jpeg"
+    file: Optional[str] = None  # 相对于任务目录的路径，未保存图片时为 None
+    template: Optional[int] = None  # 产生顶部分割点的模板序号，第一张为 None
+
+
+@dataclass
+class DuplicateRecord:
+    """去重时丢弃的一张图片"""
+
+    start_y: int  # 在裁剪后图片中的起始行（已去除模板）
+    height: int
+    duplicate_of: int  # 保留下来的相同图片的页码
+    distance: int  # 两者感知哈希的汉明距离
+
+
+@dataclass
+class JobManifest:
+    """一次分割任务产生的全部文件，替代按目录扫描"""
+
+    job_id: str
+    source: str
+    width_range: Optional[Tuple[int, int]]
+    feature_range: Optional[Tuple[int, int]]
+    threshold: float
+    match_method: str
+    templates: int = 1  # 参与匹配的模板数量
+    detector: str = "template"  # 分割点检测方式
+    scanned_positions: int = 0  # 实际计算了匹配得分的位置数
+    total_positions: int = 0  # 可匹配的位置总数
+    reused: int = 0  # 增量处理时沿用上次任务的图片数量
+    settings: Optional[str] = None  # 影响结果的参数指纹，见 settings_fingerprint
+    pdf: Optional[str] = None  # 相对于任务目录的路径
+    slices: List[SliceRecord] = field(default_factory=list)
+    duplicates: List[DuplicateRecord] = field(default_factory=list)
+
+    def save(self, job_dir: Path) -> Path:
+        """写入任务目录下的 manifest.json（先写临时文件再改名）"""
+        path = Path(job_dir) / MANIFEST_NAME
+        temp_path = path.with_suffix(".json.tmp")
+        temp_path.write_text(
+            json.dumps(asdict(self), ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+        os.replace(temp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, job_dir: Path) -> "JobManifest":
+        """读取任务目录下的 manifest.json"""
+        data = json.loads((Path(job_dir) / MANIFEST_NAME).read_text(encoding="utf-8"))
+        data["slices"] = [SliceRecord(**record) for record in data["slices"]]
+        data["duplicates"] = [
+            DuplicateRecord(**record) for record in data.get("duplicates", [])
+        ]
+        for key in ("width_range", "feature_range"):
+            if data[key] is not None:
+                data[key] = tuple(data[key])
+        return cls(**data)
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+
+# (路径, 修改时间, 大小) -> 文件内容哈希，避免同一进程重复读取文件
+_digests: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_digest(file_path: str) -> str:
+    """计算文件内容的哈希（同一进程内按修改时间和大小缓存）"""
+    stat = os.stat(file_path)
+    stat_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    if stat_key not in _digests:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file_path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+        _digests[stat_key] = digest.hexdigest()
+    return _digests[stat_key]
+
+
+@dataclass
+class CachedMatch:
+    """缓存的匹配结果"""
+
+    scores: List[np.ndarray]  # compute_multi_match_scores 的结果，每个模板一个
+    image_shape: Tuple[int, ...]  # 裁剪后图片的尺寸，用于校验
+
+
+class MatchCache:
+    """
+    磁盘上的匹配得分缓存（按最近使用淘汰，限制总大小）
+
+    同一张截图只调整阈值重新处理时，可以跳过耗时的模板匹配，
+    只需要重新挑选分割点和切分图片。
+    键由文件内容、宽度范围、模板像素、匹配方法和参数的哈希组成，
+    文件被修改后自动失效。每个条目保存为一个 <键>.npz 文件，
+    读取时更新修改时间，超出大小上限时删除最久未使用的条目。
+    """
+
+    def __init__(self, root: str = "cache/match", max_bytes: int = 256 * 1024**2):
+        """
+        Args:
+            root: 缓存目录
+            max_bytes: 缓存总大小上限（字节）
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def key(
+        self,
+        file_path: str,
+        width_range: Tuple[int, int],
+        templates: List[np.ndarray],
+        method: str,
+        options: Optional[dict] = None,
+    ) -> str:
+        """生成缓存键"""
+        digest = hashlib.blake2b(digest_size=16)
+        params = {
+            "file": file_digest(file_path),
+            "width_range": list(width_range),
+            "method": method,
+            # 预先计算的统计量（如 stats）由模板决定，不影响结果，不参与哈希
+            "options": options or {},
+        }
+        digest.update(
+            json.dumps(params, sort_keys=True, default=lambda _: None).encode()
+        )
+        for template in templates:
+            digest.update(repr((template.shape, template.dtype.str)).encode())
+            digest.update(np.ascontiguousarray(template).tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[CachedMatch]:
+        """读取缓存，不存在或已损坏时返回 None"""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                count = int(data["count"])
+                scores = [data[f"scores_{i}"] for i in range(count)]
+                image_shape = tuple(int(n) for n in data["image_shape"])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"匹配缓存已损坏，忽略: {path}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+        try:
+            os.utime(path)  # 标记为最近使用
+        except OSError:
+            pass  # 可能刚被其他进程淘汰
+        return CachedMatch(scores, image_shape)
+
+    def put(self, key: str, scores: List[np.ndarray], image_shape: Tuple[int, ...]):
+        """写入缓存（先写临时文件再改名），然后淘汰超出大小上限的条目"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        # 多个进程可能同时写入同一个键，临时文件名带上进程号
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temp_path, "wb") as f:
+            np.savez(
+                f,
+                count=len(scores),
+                image_shape=np.asarray(image_shape),
+                **{f"scores_{i}": s for i, s in enumerate(scores)},
+            )
+        os.replace(temp_path, path)
+        self._evict()
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.npz"
+
+    def _evict(self):
+        """按最近使用时间删除旧条目，直到总大小不超过上限"""
+        entries = []
+        for path in self.root.glob("*.npz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            logger.debug(f"淘汰匹配缓存: {path.name}")
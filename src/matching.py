@@ -0,0 +1,531 @@
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import cv2
+import numpy as np
+
+
+def compute_match_scores(
+    image: np.ndarray, template: np.ndarray, method: str = "template", **options
+) -> np.ndarray:
+    """
+    对整幅图片执行一次模板匹配，返回每一行的相关系数
+
+    模板与图片等宽，因此匹配结果本质上是一维的：
+    第 y 个元素表示模板放在第 y 行时的匹配得分。
+
+    Args:
+        image: 待匹配图片
+        template: 特征模板
+        method: 匹配方法，见 MATCH_METHODS
+        options: 传给具体匹配方法的参数
+
+    Returns:
+        长度为 (图片高度 - 模板高度 + 1) 的 float32 数组
+    """
+    if method not in MATCH_METHODS:
+        raise ValueError(f"未知的匹配方法: {method}")
+    return MATCH_METHODS[method](image, template, **options)
+
+
+def _template_scores(image: np.ndarray, template: np.ndarray) -> np.ndarray:
+    """使用 cv2.matchTemplate 做二维相关"""
+    result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+    return result.max(axis=1)
+
+
+def row_signatures(image: np.ndarray, columns: int = 64) -> np.ndarray:
+    """
+    把每一行压缩为若干列的均值，得到行签名
+
+    Args:
+        image: 图片 (H, W) 或 (H, W, C)
+        columns: 每行保留的列数
+
+    Returns:
+        (H, columns, C) 的 float32 数组
+    """
+    height, width = image.shape[:2]
+    columns = max(1, min(columns, width))
+    # 只缩小宽度，INTER_AREA 对每一行独立求列均值
+    signatures = cv2.resize(image, (columns, height), interpolation=cv2.INTER_AREA)
+    return signatures.reshape(height, columns, -1).astype(np.float32)
+
+
+@dataclass
+class SignatureStats:
+    """模板的行签名统计量，可预先计算并缓存，避免每次匹配重复计算"""
+
+    signature: np.ndarray  # 按通道去均值后的行签名 (h, columns, C)
+    norm2: float  # 去均值后行签名的平方和
+
+    @property
+    def columns(self) -> int:
+        return self.signature.shape[1]
+
+
+def signature_stats(template: np.ndarray, columns: int = 64) -> SignatureStats:
+    """计算模板的行签名统计量"""
+    signature = row_signatures(template, columns)
+    signature -= signature.mean(axis=(0, 1))
+    return SignatureStats(signature, float((signature.astype(np.float64) ** 2).sum()))
+
+
+def _row_cumsum(values: np.ndarray) -> np.ndarray:
+    """沿第 0 维的累积和，开头补一行 0"""
+    cumsum = np.zeros((values.shape[0] + 1,) + values.shape[1:], dtype=np.float64)
+    np.cumsum(values, axis=0, out=cumsum[1:])
+    return cumsum
+
+
+def _window_sums(cumsum: np.ndarray, window: int) -> np.ndarray:
+    """由 _row_cumsum 的结果求长度为 window 的滑动窗口和"""
+    return cumsum[window:] - cumsum[:-window]
+
+
+def _signature_scores(
+    image: np.ndarray,
+    template: np.ndarray,
+    columns: int = 64,
+    chunk_columns: int = 16,
+    stats: Optional[SignatureStats] = None,
+) -> np.ndarray:
+    """
+    基于行签名的一维归一化相关 (与 TM_CCOEFF_NORMED 定义一致)
+
+    模板与图片等宽，二维相关退化为沿行方向的一维滑动相关。
+    分子用 FFT 计算，分母用累积和求滑动窗口的均值和方差。
+
+    Args:
+        stats: 预先计算的模板统计量（见 signature_stats），列数不符时重新计算
+    """
+    return _signature_scores_multi(image, [template], columns, chunk_columns, [stats])[
+        0
+    ]
+
+
+def _signature_scores_multi(
+    image: np.ndarray,
+    templates: List[np.ndarray],
+    columns: int = 64,
+    chunk_columns: int = 16,
+    stats: Optional[List[Optional[SignatureStats]]] = None,
+) -> List[np.ndarray]:
+    """
+    多个模板共用一次图片行签名、FFT 和累积和的签名匹配
+
+    图片的频谱每个分块只计算一次，每个模板只增加一次频域乘法和逆变换。
+    """
+    signatures = row_signatures(image, columns)
+    height, columns, _ = signatures.shape
+    stats = list(stats or [None] * len(templates))
+    for i, template in enumerate(templates):
+        if stats[i] is None or stats[i].columns != columns:
+            stats[i] = signature_stats(template, columns)
+
+    # 分子：逐列做 FFT 相关并在频域累加，分块处理以控制内存
+    flat_image = signatures.reshape(height, -1)
+    fft_size = cv2.getOptimalDFTSize(height)
+    spectra = np.zeros((len(templates), fft_size // 2 + 1), dtype=np.complex128)
+    for start in range(0, flat_image.shape[1], chunk_columns):
+        end = start + chunk_columns
+        image_fft = np.fft.rfft(flat_image[:, start:end], fft_size, axis=0)
+        for i, template_stats in enumerate(stats):
+            flat_template = template_stats.signature.reshape(
+                template_stats.signature.shape[0], -1
+            )
+            template_fft = np.fft.rfft(flat_template[:, start:end], fft_size, axis=0)
+            spectra[i] += (image_fft * np.conj(template_fft)).sum(axis=1)
+
+    # 分母：滑动窗口内各通道方差之和
+    row_sum = _row_cumsum(signatures.sum(axis=1, dtype=np.float64))
+    row_sq_sum = _row_cumsum(np.square(signatures, dtype=np.float64).sum(axis=1))
+
+    results = []
+    for spectrum, template_stats in zip(spectra, stats):
+        template_height = template_stats.signature.shape[0]
+        length = height - template_height + 1
+        count = template_height * columns  # 每个通道参与计算的元素数
+        numerator = np.fft.irfft(spectrum, fft_size)[:length]
+
+        window_sum = _window_sums(row_sum, template_height)
+        window_sq_sum = _window_sums(row_sq_sum, template_height)
+        variance = (window_sq_sum - window_sum**2 / count).sum(axis=1)
+        denominator = np.sqrt(np.maximum(variance, 0) * template_stats.norm2)
+
+        # 分母为 0（纯色区域）时与 OpenCV 一致，得分记为 0
+        scores = np.zeros(length, dtype=np.float32)
+        valid = denominator > 1e-6
+        scores[valid] = np.clip(numerator[valid] / denominator[valid], -1.0, 1.0)
+        results.append(scores)
+    return results
+
+
+def _downscale_gray(image: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """转为灰度并缩小到 size (宽, 高)"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def _pyramid_scores(
+    image: np.ndarray,
+    template: np.ndarray,
+    scale: float = 0.25,
+    radius: int = 4,
+    coarse_threshold: float = 0.5,
+) -> np.ndarray:
+    """
+    由粗到细的金字塔匹配
+
+    先在缩小的灰度图上找候选位置，再只在候选位置附近的行窗口内
+    做全分辨率匹配。窗口内的得分与全图匹配完全一致，
+    未计算的位置记为 NaN（不会超过任何阈值）。
+
+    纵向按整数倍 rows 缩小，图片中的一个缩小行对应原图连续 rows 行。
+    模板在原图中的起始行不一定落在这个网格上，单独缩小的模板与图片的
+    行相位不一致时粗匹配得分会大幅下降。因此对每个行相位分别去掉模板
+    顶部的几行，使模板从网格边界开始，再缩小匹配：真实位置总有一个相位
+    与网格完全对齐，粗匹配得分与原图相同内容一致。
+
+    Args:
+        scale: 粗匹配的缩放比例，纵向取最接近的整数倍 1 / scale
+        radius: 细化时在候选位置上下额外搜索的行数（原图坐标）
+        coarse_threshold: 粗匹配的候选阈值，应低于最终阈值
+    """
+    template_height = template.shape[0]
+    length = image.shape[0] - template_height + 1
+    rows = max(1, round(1 / scale))
+
+    # 缩小后模板太矮时无法粗匹配，直接做全图匹配
+    if scale >= 1 or template_height < 3 * rows:
+        return _template_scores(image, template)
+
+    # 1. 在缩小的灰度图上粗匹配，每个行相位一次
+    width = max(1, round(image.shape[1] * scale))
+    usable = image.shape[0] // rows * rows
+    small_image = _downscale_gray(image[:usable], (width, usable // rows))
+    candidates = []
+    for phase in range(rows):
+        # 去掉顶部 phase 行后，模板在 y + phase 处从网格边界开始
+        trimmed = (template_height - phase) // rows * rows
+        small_template = _downscale_gray(
+            template[phase : phase + trimmed], (width, trimmed // rows)
+        )
+        coarse = _template_scores(small_image, small_template)
+        positions = np.flatnonzero(coarse >= coarse_threshold) * rows - phase
+        candidates.append(positions[(positions >= 0) & (positions < length)])
+    candidates = np.unique(np.concatenate(candidates))
+
+    scores = np.full(length, np.nan, dtype=np.float32)
+    if candidates.size == 0:
+        return scores
+
+    # 2. 合并重叠的细化窗口
+    starts = np.clip(candidates - radius, 0, length)
+    ends = np.clip(candidates + radius + 1, 0, length)
+    delta = np.zeros(length + 1, dtype=np.int64)
+    np.add.at(delta, starts, 1)
+    np.add.at(delta, ends, -1)
+    covered = np.cumsum(delta[:-1]) > 0
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], covered.view(np.int8), [0]))))
+
+    # 3. 只在窗口内做全分辨率匹配
+    for start, end in edges.reshape(-1, 2):
+        window = image[start : end + template_height - 1]
+        scores[start:end] = _template_scores(window, template)
+
+    return scores
+
+
+def _predictive_scores(
+    image: np.ndarray,
+    template: np.ndarray,
+    threshold: float = 0.8,
+    warmup: int = 3,
+    radius: int = 64,
+    block: int = 1024,
+    engine: str = "template",
+) -> np.ndarray:
+    """
+    按页面周期预测下一个分割点，只在预测位置附近匹配
+
+    文档截图的页面高度几乎相同。先顺序全量匹配，找到 warmup 个分割点后
+    用相邻分割点间距的中位数估计周期，之后只在“上一个分割点 + 周期”
+    前后 radius 行内匹配；窗口内没有匹配时，对上一个分割点到下一个周期末尾
+    之间的区域回退为全量匹配，再继续预测。
+    未计算的位置记为 NaN（不会超过任何阈值），非 NaN 的数量即实际扫描的位置数。
+
+    注意：预测窗口之前的位置不会被扫描，比周期短得多的页面可能被合并。
+
+    Args:
+        threshold: 判定分割点的阈值，应不高于最终阈值
+        warmup: 估计周期所需的分割点数量（至少 2）
+        radius: 预测窗口的半径（行）
+        block: 全量匹配时每次处理的行数
+        engine: 实际计算得分的匹配方法
+    """
+    template_height = template.shape[0]
+    length = image.shape[0] - template_height + 1
+    scores = np.full(length, np.nan, dtype=np.float32)
+    min_distance = max(1, template_height // 2)
+    match = MATCH_METHODS[engine]
+
+    def scan(start: int, end: int) -> List[int]:
+        """计算 [start, end) 的得分，返回其中的分割点"""
+        start, end = max(start, 0), min(end, length)
+        if start >= end:
+            return []
+        scores[start:end] = match(image[start : end + template_height - 1], template)
+        points = pick_split_points(scores[start:end], threshold, min_distance)
+        return [start + point for point in points]
+
+    boundaries: List[int] = []
+    cursor = 0  # 之前的位置已经处理完毕
+    while cursor < length:
+        if len(boundaries) < max(warmup, 2):
+            # 周期未知：顺序全量匹配
+            end = cursor + block
+            found = scan(cursor, end)
+        else:
+            period = max(int(np.median(np.diff(boundaries[-warmup:]))), 1)
+            # 上一次预测落空时，顺延整数个周期到尚未处理的位置
+            periods = max(1, -(-(cursor - radius - boundaries[-1]) // period))
+            expected = boundaries[-1] + periods * period
+            window_start = max(expected - radius, cursor)
+            end = expected + radius + 1
+            found = scan(window_start, end)
+            if not found:
+                # 预测落空：窗口前后的区域回退为全量匹配，直到下一个周期末尾
+                found = scan(cursor, window_start)
+                end = max(end, expected + period)
+                found += scan(expected + radius + 1, end)
+
+        for point in found:
+            if not boundaries or point - boundaries[-1] >= min_distance:
+                boundaries.append(point)
+        cursor = max(end, cursor + 1)
+
+    return scores
+
+
+# 可选的匹配方法
+MATCH_METHODS = {
+    "template": _template_scores,
+    "signature": _signature_scores,
+    "pyramid": _pyramid_scores,
+    "predictive": _predictive_scores,
+}
+
+
+def compute_multi_match_scores(
+    image: np.ndarray,
+    templates: List[np.ndarray],
+    method: str = "template",
+    template_options: Optional[List[dict]] = None,
+    **options,
+) -> List[np.ndarray]:
+    """
+    用多个模板匹配同一幅图片，返回每个模板的一维得分
+
+    "signature" 方法的图片行签名和频谱只计算一次，由所有模板共用；
+    其他方法依次对每个模板匹配。比图片还高的模板得到空数组。
+
+    Args:
+        templates: 特征模板列表，宽度相同、高度可以不同
+        template_options: 与 templates 一一对应的单独参数（如缓存的 stats），与 options 合并
+        options: 所有模板共用的参数
+    """
+    if method not in MATCH_METHODS:
+        raise ValueError(f"未知的匹配方法: {method}")
+    template_options = template_options or [{} for _ in templates]
+    if len(template_options) != len(templates):
+        raise ValueError("template_options 必须与 templates 一一对应")
+    fits = [t.shape[0] <= image.shape[0] for t in templates]
+
+    if method == "signature":
+        results = [np.empty(0, dtype=np.float32) for _ in templates]
+        indices = [i for i, fit in enumerate(fits) if fit]
+        if indices:
+            shared = _signature_scores_multi(
+                image,
+                [templates[i] for i in indices],
+                stats=[template_options[i].get("stats") for i in indices],
+                **options,
+            )
+            for i, template_scores in zip(indices, shared):
+                results[i] = template_scores
+        return results
+
+    return [
+        (
+            compute_match_scores(image, t, method, **{**options, **o})
+            if fit
+            else np.empty(0, dtype=np.float32)
+        )
+        for t, o, fit in zip(templates, template_options, fits, strict=True)
+    ]
+
+
+def combine_match_scores(
+    scores: List[np.ndarray], length: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    合并多个模板的得分：每个位置取得分最高的模板
+
+    不同高度的模板得分长度不同，较短的部分视为未计算 (NaN)。
+
+    Args:
+        scores: compute_multi_match_scores 的结果
+        length: 输出长度，默认取最长的得分
+
+    Returns:
+        (每个位置的最高得分, 对应的模板序号)，没有任何模板计算过的位置得分为 NaN
+    """
+    if length is None:
+        length = max(len(s) for s in scores)
+    if len(scores) == 1 and len(scores[0]) >= length:
+        return scores[0][:length], np.zeros(length, dtype=np.intp)
+
+    stacked = np.full((len(scores), length), -np.inf, dtype=np.float32)
+    for i, template_scores in enumerate(scores):
+        count = min(len(template_scores), length)
+        stacked[i, :count] = np.nan_to_num(template_scores[:count], nan=-np.inf)
+    tags = stacked.argmax(axis=0)
+    best = stacked[tags, np.arange(length)]
+    best[np.isneginf(best)] = np.nan
+    return best, tags
+
+
+def pick_split_points(
+    scores: np.ndarray,
+    threshold: float,
+    min_distance: int,
+    start: Optional[int] = None,
+) -> List[int]:
+    """
+    根据阈值从匹配得分中挑选分割点（向量化的非极大值抑制）
+
+    先把连续超过阈值的位置归为一段，每段取得分最高的位置（并列时取最靠前的）；
+    再按顺序保留与上一个保留的峰值相距至少 min_distance 的峰值。
+    峰值查找全部由 NumPy 完成，只有最后的间距筛选按保留的分割点逐个跳转，
+    耗时与超过阈值的位置数量成线性关系。
+
+    Args:
+        scores: compute_match_scores 返回的一维得分，NaN 视为未超过阈值
+        threshold: 匹配阈值
+        min_distance: 相邻分割点的最小间距
+        start: 上一个分割点位置，分割点与它的距离至少为 min_distance
+
+    Returns:
+        分割点y坐标列表
+    """
+    locations = np.flatnonzero(scores >= threshold)
+    peaks = locations[_run_peaks(locations, scores[locations])]
+    return peaks[_suppress_close(peaks, min_distance, start)].tolist()
+
+
+def _run_peaks(locations: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    把有序的位置按是否连续分段，返回每段得分最高的位置在 locations 中的下标
+
+    并列时取段内最靠前的位置。
+    """
+    if locations.size == 0:
+        return locations
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(locations) > 1) + 1))
+    run_max = np.maximum.reduceat(values, starts)
+    run_ids = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(values))))
+    candidates = np.flatnonzero(values == run_max[run_ids])
+    # 每段只保留第一个达到最大值的位置
+    first = np.concatenate(([True], np.diff(run_ids[candidates]) != 0))
+    return candidates[first]
+
+
+def _suppress_close(
+    peaks: np.ndarray, min_distance: int, start: Optional[int] = None
+) -> np.ndarray:
+    """
+    按顺序保留与上一个保留的峰值相距至少 min_distance 的峰值，返回保留的下标
+
+    每个峰值之后第一个足够远的峰值由 searchsorted 一次求出（下标 len(peaks)
+    表示没有），保留的峰值就是从第一个峰值出发沿这个映射依次跳转经过的位置。
+    用倍增法求出这条路径：每轮把已知的路径延长一倍，并把映射自身复合一次，
+    轮数为分割点数的对数，不需要逐个峰值的 Python 循环。
+    """
+    # 间距为 0 时每个峰值都跳回自身，路径无法前进；峰值互不相同，按 1 处理即可
+    min_distance = max(1, min_distance)
+    count = len(peaks)
+    jump = np.append(np.searchsorted(peaks, peaks + min_distance), count)
+    first = 0 if start is None else np.searchsorted(peaks, start + min_distance)
+    path = np.array([first], dtype=np.intp)
+    while path[-1] < count:
+        path = np.concatenate((path, jump[path]))
+        jump = jump[jump]
+    return path[path < count]
+
+
+class StreamingPeakPicker:
+    """
+    逐段输入得分的 pick_split_points
+
+    每段末尾仍超过阈值的一段位置可能延续到下一段，暂存起来，
+    与下一段合并后再决定峰值，结果与一次处理全部得分相同。
+    """
+
+    def __init__(self, threshold: float, min_distance: int, start: int = 0):
+        self.threshold = threshold
+        self.min_distance = min_distance
+        self.start = start  # 上一个已确定的分割点
+        # 暂存的一段位置：(位置, 得分, 标签)
+        self.pending = (
+            np.empty(0, dtype=np.intp),
+            np.empty(0, dtype=np.float32),
+            np.empty(0, dtype=np.intp),
+        )
+
+    def feed(
+        self, scores: np.ndarray, offset: int, tags: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, int]]:
+        """
+        输入从 offset 开始的一段得分，返回已经确定的 (分割点, 标签)
+
+        Args:
+            scores: 一段得分，覆盖全图的 [offset, offset + len(scores))
+            offset: 这段得分第一个元素的位置
+            tags: 每个位置的标签（如模板序号），默认全为 0
+        """
+        local = np.flatnonzero(scores >= self.threshold)
+        tags = np.zeros(len(scores), dtype=np.intp) if tags is None else tags
+        locations = np.concatenate((self.pending[0], local + offset))
+        values = np.concatenate((self.pending[1], scores[local]))
+        labels = np.concatenate((self.pending[2], tags[local]))
+
+        # 一直延续到段末尾的连续位置可能和下一段连在一起
+        end = offset + len(scores)
+        open_from = len(locations)
+        if open_from and locations[-1] == end - 1:
+            breaks = np.flatnonzero(np.diff(locations) > 1)
+            open_from = breaks[-1] + 1 if breaks.size else 0
+        self.pending = (
+            locations[open_from:],
+            values[open_from:],
+            labels[open_from:],
+        )
+        return self._emit(locations[:open_from], values[:open_from], labels[:open_from])
+
+    def finish(self) -> List[Tuple[int, int]]:
+        """输入结束，输出暂存的一段"""
+        result = self._emit(*self.pending)
+        self.pending = tuple(array[:0] for array in self.pending)
+        return result
+
+    def _emit(
+        self, locations: np.ndarray, values: np.ndarray, labels: np.ndarray
+    ) -> List[Tuple[int, int]]:
+        indices = _run_peaks(locations, values)
+        indices = indices[
+            _suppress_close(locations[indices], self.min_distance, self.start)
+        ]
+        if indices.size:
+            self.start = int(locations[indices[-1]])
+        return list(zip(locations[indices].tolist(), labels[indices].tolist()))
@@ -1,58 +1,160 @@
+import time
+from io import BytesIO
+from itertools import chain
 from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple, Union
+import cv2
+import numpy as np
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
 from PIL import Image
 from loguru import logger
+from src.pdf_writer import EncodedImage, PDFWriter
+
+# 一页的图片：文件路径、已编码的图片数据 (PNG/JPEG) 或 BGR 数组
+PageImage = Union[Path, str, bytes, EncodedImage, np.ndarray]
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg")
+
+
+def _split_page_name(path: Path) -> Tuple[str, Optional[int]]:
+    """把 "名称_序号" 形式的文件名拆分为 (名称, 序号)，没有序号时序号为 None"""
+    base_name, _, number = path.stem.rpartition("_")
+    if base_name and number.isdigit():
+        return base_name, int(number)
+    return path.stem, None
+
+
+def _page_sort_key(path: Path):
+    """按序号排序，没有序号的文件排在最后并按名称排序"""
+    _, number = _split_page_name(path)
+    return (number is None, number or 0, path.name)
 
 
 class PDFGenerator:
-    def __init__(self, image_dir: Path, pdf_dir: Path):
+    def __init__(
+        self, image_dir: Optional[Path], pdf_dir: Path, engine: str = "direct"
+    ):
         """
         初始化PDF生成器
 
         Args:
-            image_dir: 图片所在目录
+            image_dir: 图片所在目录，为 None 时只使用 generate 传入的内存图片
             pdf_dir: PDF输出目录
+            engine: "direct" 直接嵌入已编码的图片数据（不重新编码），逐页落盘，内存占用恒定；
+                "reportlab" 使用 reportlab 绘制，保存前所有页面都留在内存中
         """
         self.image_dir = image_dir
         self.pdf_dir = pdf_dir
-        self.image_files = sorted(
-            list(image_dir.glob("*.png")), key=lambda x: int(x.stem.split("_")[-1])
-        )
+        self.engine = engine
+        self.image_files = []
+        if image_dir is not None:
+            self.image_files = sorted(
+                [p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES],
+                key=_page_sort_key,
+            )
 
-    def generate(self, output_path: str = None) -> Path:
+        # 最近一次生成的统计信息：页数、PDF 组装用时（秒）、文件大小（字节）
+        self.stats = {"pages": 0, "seconds": 0.0, "size": 0}
+
+    def generate(
+        self, output_path: str = None, slices: Optional[Iterable[PageImage]] = None
+    ) -> Path:
         """
         生成PDF文件
 
         Args:
             output_path: PDF输出路径，默认为PDF目录下的同名PDF
+            slices: 按页顺序的图片，可以是惰性迭代器；默认使用图片目录中的文件
 
         Returns:
             生成的PDF文件路径
         """
-        if not self.image_files:
+        if slices is None:
+            slices = self.image_files
+        pages = iter(slices)
+        first_page = next(pages, None)
+        if first_page is None:
             logger.warning("没有找到图片文件")
             return None
 
         if output_path is None:
+            if not self.image_files:
+                raise ValueError("使用内存图片生成PDF时必须指定输出路径")
             # 使用第一张图片的名称（去掉序号）作为PDF名称
-            base_name = "_".join(self.image_files[0].stem.split("_")[:-1])
+            base_name, _ = _split_page_name(self.image_files[0])
             output_path = self.pdf_dir / f"{base_name}.pdf"
 
         logger.info(f"开始生成PDF: {output_path}")
 
+        pages = chain([first_page], pages)
+        if self.engine == "direct":
+            self._generate_direct(output_path, pages)
+        else:
+            self._generate_reportlab(output_path, pages)
+
+        self.stats["size"] = Path(output_path).stat().st_size
+        logger.success(
+            f"PDF生成完成: {output_path}，共 {self.stats['pages']} 页，"
+            f"{self.stats['size'] / 1024 / 1024:.2f} MB，"
+            f"用时 {self.stats['seconds']:.2f} 秒"
+        )
+
+        return output_path
+
+    def _generate_direct(self, output_path: Path, pages: Iterator[PageImage]):
+        """
+        直接写出 PDF，JPEG/PNG 数据原样嵌入
+
+        每页写完立即落盘，内存中只保留交叉引用表，适合上千页的文档。
+        """
+        writer = PDFWriter(output_path)
+        page_count = 0
+        seconds = 0.0
+        try:
+            for page in pages:
+                start = time.perf_counter()
+                writer.add_image(self._to_encoded(page))
+                seconds += time.perf_counter() - start
+                page_count += 1
+        except BaseException:
+            writer.abort()
+            raise
+
+        start = time.perf_counter()
+        writer.close()
+        seconds += time.perf_counter() - start
+        self.stats = {"pages": page_count, "seconds": seconds, "size": 0}
+
+    @staticmethod
+    def _to_encoded(page: PageImage) -> Union[EncodedImage, np.ndarray]:
+        """把一页图片转换为 PDFWriter 可以直接嵌入的数据"""
+        if isinstance(page, (EncodedImage, np.ndarray)):
+            return page
+        if isinstance(page, (bytes, bytearray, memoryview)):
+            return EncodedImage.from_bytes(page)
+        return EncodedImage.from_bytes(Path(page).read_bytes())
+
+    def _generate_reportlab(self, output_path: Path, pages: Iterator[PageImage]):
+        """使用 reportlab 绘制 PDF（图片会被重新编码）"""
+        page_count = 0
+        seconds = 0.0
+
         # 创建PDF文档
         c = canvas.Canvas(str(output_path), pagesize=A4)
         page_width, page_height = A4
 
-        for img_path in self.image_files:
-            # 打开图片
-            img = Image.open(img_path)
+        for page in pages:
+            start = time.perf_counter()
+
+            # 打开图片（内存图片不经过磁盘）
+            img, width, height = self._open_page(page)
 
             # 计算缩放比例，使图片适应页面宽度
-            scale = page_width / img.width
+            scale = page_width / width
             img_width = page_width
-            img_height = img.height * scale
+            img_height = height * scale
 
             # 如果图片高度超过页面高度，进行等比例缩小
             if img_height > page_height:
@@ -66,7 +168,7 @@ class PDFGenerator:
 
             # 将图片添加到PDF
             c.drawImage(
-                str(img_path),
+                img,
                 x,
                 y,
                 width=img_width,
@@ -76,9 +178,27 @@ class PDFGenerator:
 
             # 添加新页面
             c.showPage()
+            page_count += 1
+            seconds += time.perf_counter() - start
 
         # 保存PDF
+        start = time.perf_counter()
         c.save()
-        logger.success(f"PDF生成完成: {output_path}")
-
-        return output_path
+        seconds += time.perf_counter() - start
+        self.stats = {"pages": page_count, "seconds": seconds, "size": 0}
+
+    @staticmethod
+    def _open_page(page: PageImage) -> Tuple[ImageReader, int, int]:
+        """把一页图片包装成 reportlab 可以直接绘制的对象"""
+        if isinstance(page, np.ndarray):
+            if page.ndim == 3:
+                page = cv2.cvtColor(page, cv2.COLOR_BGR2RGB)
+            reader = ImageReader(Image.fromarray(page))
+        elif isinstance(page, EncodedImage):
+            reader = ImageReader(BytesIO(page.data))
+        elif isinstance(page, (bytes, bytearray, memoryview)):
+            reader = ImageReader(BytesIO(page))
+        else:
+            reader = ImageReader(str(page))
+        width, height = reader.getSize()
+        return reader, width, height
@@ -0,0 +1,224 @@
+import struct
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, List, Optional, Tuple
+import cv2
+import numpy as np
+from reportlab.lib.pagesizes import A4
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SIGNATURE = b"\xff\xd8"
+
+# JPEG 中携带图片尺寸的 SOF 标记（排除 DHT/JPG/DAC）
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# 颜色分量数 -> PDF 颜色空间
+COLOR_SPACES = {1: "/DeviceGray", 3: "/DeviceRGB", 4: "/DeviceCMYK"}
+
+
+@dataclass
+class EncodedImage:
+    """已编码的图片数据 (PNG/JPEG)，可直接嵌入 PDF"""
+
+    data: bytes
+    format: str  # "png" 或 "jpeg"
+    width: int
+    height: int
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "EncodedImage":
+        """根据文件头识别格式并读取尺寸"""
+        data = bytes(data)
+        if data.startswith(PNG_SIGNATURE):
+            width, height = struct.unpack(">II", data[16:24])
+            return cls(data, "png", width, height)
+        if data.startswith(JPEG_SIGNATURE):
+            width, height, _ = _jpeg_info(data)
+            return cls(data, "jpeg", width, height)
+        raise ValueError("无法识别的图片格式，仅支持 PNG 和 JPEG")
+
+
+def _jpeg_info(data: bytes) -> Tuple[int, int, int]:
+    """从 JPEG 的 SOF 段读取 (宽, 高, 颜色分量数)"""
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            pos += 1
+            continue
+        marker = data[pos + 1]
+        if marker == 0xFF or 0xD0 <= marker <= 0xD9 or marker == 0x01:
+            pos += 2  # 填充字节或不带长度的标记
+            continue
+        (length,) = struct.unpack(">H", data[pos + 2 : pos + 4])
+        if marker in JPEG_SOF_MARKERS:
+            height, width, components = struct.unpack(">HHB", data[pos + 5 : pos + 10])
+            return width, height, components
+        pos += 2 + length
+    raise ValueError("JPEG 数据中没有找到图片尺寸")
+
+
+def _png_chunks(data: bytes):
+    """依次生成 PNG 的 (类型, 数据)"""
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack(">I4s", data[pos : pos + 8])
+        yield chunk_type, data[pos + 8 : pos + 8 + length]
+        pos += 12 + length
+
+
+class PDFWriter:
+    """
+    直接写出 PDF 的最小实现
+
+    - JPEG 原样作为 DCTDecode 流嵌入，不重新编码
+    - 8 位、非隔行的灰度/RGB PNG 把 IDAT 数据原样作为 FlateDecode 流嵌入
+      （PDF 的 PNG 预测器与 PNG 行过滤器一致），不解码也不重新压缩
+    - 其他图片解码为原始像素后压缩为一个 FlateDecode 流
+
+    每张图片占一页，按页面宽度缩放并居中，与 reportlab 版本的排版一致。
+
+    对象在添加时立即写入文件，内存中只保留交叉引用表（每个对象的偏移量）
+    和页面对象编号，因此内存占用不随页数增长。
+    """
+
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, output_path: Path, page_size: Tuple[float, float] = A4):
+        self.output_path = Path(output_path)
+        self.page_width, self.page_height = page_size
+        # 对象偏移量，下标为对象编号 - 1；Catalog 和 Pages 在 close 时写出
+        self.offsets: List[Optional[int]] = [None, None]
+        self.page_ids: List[int] = []
+        self.file: BinaryIO = open(self.output_path, "wb")
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write_object(
+        self, object_id: int, dictionary: str, stream: Optional[bytes] = None
+    ):
+        """把对象写入文件并记录偏移量"""
+        self.offsets[object_id - 1] = self.file.tell()
+        if stream is not None:
+            dictionary = dictionary[:-2] + f" /Length {len(stream)} >>"
+        self.file.write(f"{object_id} 0 obj\n{dictionary}".encode("latin-1"))
+        if stream is not None:
+            self.file.write(b"\nstream\n")
+            self.file.write(stream)
+            self.file.write(b"\nendstream")
+        self.file.write(b"\nendobj\n")
+
+    def _add_object(self, dictionary: str, stream: Optional[bytes] = None) -> int:
+        """添加一个对象并立即写出，返回对象编号"""
+        self.offsets.append(None)
+        object_id = len(self.offsets)
+        self._write_object(object_id, dictionary, stream)
+        return object_id
+
+    def add_image(self, image) -> None:
+        """添加一页图片：EncodedImage 或 BGR/灰度数组"""
+        if isinstance(image, np.ndarray):
+            xobject_id, width, height = self._add_pixels(image)
+        elif image.format == "jpeg":
+            xobject_id, width, height = self._add_jpeg(image)
+        else:
+            xobject_id, width, height = self._add_png(image)
+        self._add_page(xobject_id, width, height)
+
+    def _add_jpeg(self, image: EncodedImage) -> Tuple[int, int, int]:
+        width, height, components = _jpeg_info(image.data)
+        xobject_id = self._add_object(
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace {COLOR_SPACES[components]} /BitsPerComponent 8 "
+            f"/Filter /DCTDecode >>",
+            image.data,
+        )
+        return xobject_id, width, height
+
+    def _add_png(self, image: EncodedImage) -> Tuple[int, int, int]:
+        chunks = list(_png_chunks(image.data))
+        width, height, bit_depth, color_type, _, _, interlace = struct.unpack(
+            ">IIBBBBB", chunks[0][1]
+        )
+        components = {0: 1, 2: 3}.get(color_type)
+        if bit_depth != 8 or interlace or components is None:
+            # 调色板、透明通道等无法直接嵌入，解码后按原始像素处理
+            pixels = cv2.imdecode(np.frombuffer(image.data, np.uint8), cv2.IMREAD_COLOR)
+            return self._add_pixels(pixels)
+
+        idat = b"".join(data for chunk_type, data in chunks if chunk_type == b"IDAT")
+        xobject_id = self._add_object(
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace {COLOR_SPACES[components]} /BitsPerComponent 8 "
+            f"/Filter /FlateDecode /DecodeParms << /Predictor 15 "
+            f"/Colors {components} /BitsPerComponent 8 /Columns {width} >> >>",
+            idat,
+        )
+        return xobject_id, width, height
+
+    def _add_pixels(self, pixels: np.ndarray) -> Tuple[int, int, int]:
+        height, width = pixels.shape[:2]
+        if pixels.ndim == 3:
+            pixels = cv2.cvtColor(pixels, cv2.COLOR_BGR2RGB)
+        components = 1 if pixels.ndim == 2 else 3
+        xobject_id = self._add_object(
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace {COLOR_SPACES[components]} /BitsPerComponent 8 "
+            f"/Filter /FlateDecode >>",
+            zlib.compress(np.ascontiguousarray(pixels).tobytes(), 6),
+        )
+        return xobject_id, width, height
+
+    def _add_page(self, xobject_id: int, width: int, height: int):
+        # 计算缩放比例，使图片适应页面宽度，超高时等比例缩小
+        img_width = self.page_width
+        img_height = height * self.page_width / width
+        if img_height > self.page_height:
+            img_width *= self.page_height / img_height
+            img_height = self.page_height
+
+        # 计算居中位置
+        x = (self.page_width - img_width) / 2
+        y = (self.page_height - img_height) / 2
+
+        content = f"q {img_width:.4f} 0 0 {img_height:.4f} {x:.4f} {y:.4f} cm /Im0 Do Q"
+        content_id = self._add_object("<< >>", content.encode("latin-1"))
+        page_id = self._add_object(
+            f"<< /Type /Page /Parent {self.PAGES_ID} 0 R "
+            f"/MediaBox [0 0 {self.page_width:.4f} {self.page_height:.4f}] "
+            f"/Resources << /XObject << /Im0 {xobject_id} 0 R >> >> "
+            f"/Contents {content_id} 0 R >>"
+        )
+        self.page_ids.append(page_id)
+
+    def close(self) -> int:
+        """写出页面树和交叉引用表，返回文件大小"""
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self._write_object(
+            self.CATALOG_ID, f"<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>"
+        )
+        self._write_object(
+            self.PAGES_ID,
+            f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>",
+        )
+
+        xref_offset = self.file.tell()
+        self.file.write(f"xref\n0 {len(self.offsets) + 1}\n".encode("latin-1"))
+        self.file.write(b"0000000000 65535 f \n")
+        self.file.write(
+            "".join(f"{offset:010d} 00000 n \n" for offset in self.offsets).encode(
+                "latin-1"
+            )
+        )
+        self.file.write(
+            f"trailer\n<< /Size {len(self.offsets) + 1} /Root {self.CATALOG_ID} 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n".encode("latin-1")
+        )
+        size = self.file.tell()
+        self.file.close()
+        return size
+
+    def abort(self):
+        """放弃写入并删除不完整的文件"""
+        self.file.close()
+        self.output_path.unlink(missing_ok=True)
@@ -0,0 +1,169 @@
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+
+
+def uniform_rows(
+    image: np.ndarray,
+    tolerance: int = 8,
+    gap_color: Optional[Tuple[int, int, int]] = None,
+) -> np.ndarray:
+    """
+    判断每一行是否为纯色
+
+    一行内每个通道的最大值与最小值之差不超过 tolerance 即视为纯色。
+    用 cv2.reduce 逐行求最大/最小值，只遍历一次像素，没有与图片等大的临时数组，
+    可直接用于裁剪后的非连续视图。
+
+    Args:
+        image: 图片 (H, W) 或 (H, W, C)
+        tolerance: 允许的颜色波动
+        gap_color: 间隔颜色 (B, G, R)，指定后只有接近该颜色的纯色行才算数
+
+    Returns:
+        长度为 H 的布尔数组
+    """
+    height = image.shape[0]
+    row_max = cv2.reduce(image, 1, cv2.REDUCE_MAX).reshape(height, -1)
+    row_min = cv2.reduce(image, 1, cv2.REDUCE_MIN).reshape(height, -1)
+    row_max = row_max.astype(np.int16)
+    row_min = row_min.astype(np.int16)
+    uniform = (row_max - row_min <= tolerance).all(axis=1)
+    if gap_color is not None:
+        color = np.asarray(gap_color, dtype=np.int16)[: row_max.shape[1]]
+        uniform &= (np.abs(row_max - color) <= tolerance).all(axis=1)
+        uniform &= (np.abs(row_min - color) <= tolerance).all(axis=1)
+    return uniform
+
+
+def detect_width_range(
+    image: np.ndarray, sample_rows: int = 1024, tolerance: int = 8
+) -> Tuple[int, int]:
+    """
+    自动检测内容区域的宽度范围（去掉左右两侧的纯色背景）
+
+    只按固定间隔抽取 sample_rows 行计算每一列的均值和标准差，
+    耗时与图片高度基本无关。左右两侧与最外一列颜色相同且上下没有变化的列
+    视为背景；文档页面自身的白色边距颜色与背景不同，会被保留。
+
+    Args:
+        image: 图片 (H, W) 或 (H, W, C)
+        sample_rows: 抽样的行数
+        tolerance: 允许的颜色波动
+
+    Returns:
+        (start_x, end_x)，没有背景时为整个宽度
+    """
+    height, width = image.shape[:2]
+    step = max(1, height // sample_rows)
+    sample = image[::step].astype(np.float32)
+    if sample.ndim == 2:
+        sample = sample[:, :, None]
+
+    column_mean = sample.mean(axis=0)  # (W, C)
+    column_std = np.sqrt(np.maximum((sample * sample).mean(axis=0) - column_mean**2, 0))
+    flat = (column_std <= tolerance).all(axis=1)
+
+    def background(edge: int) -> np.ndarray:
+        return flat & (np.abs(column_mean - column_mean[edge]) <= tolerance).all(axis=1)
+
+    content_left = np.flatnonzero(~background(0))
+    content_right = np.flatnonzero(~background(-1))
+    if content_left.size == 0 or content_right.size == 0:
+        return 0, width  # 整幅图片都是纯色
+    start_x, end_x = int(content_left[0]), int(content_right[-1]) + 1
+    if start_x >= end_x:
+        return 0, width
+    return start_x, end_x
+
+
+def find_runs(mask: np.ndarray, offset: int = 0) -> List[Tuple[int, int]]:
+    """找出连续为 True 的区间 [start, end)，坐标加上 offset"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    return [(int(s) + offset, int(e) + offset) for s, e in edges.reshape(-1, 2)]
+
+
+class GapDetector:
+    """
+    检测页面之间的纯色间隔，不需要特征模板
+
+    可以一次处理整幅图片 (detect)，也可以逐条带输入 (feed/finish)，
+    跨越条带边界的间隔会被拼接为一个。
+    """
+
+    def __init__(
+        self,
+        min_height: int = 10,
+        tolerance: int = 8,
+        gap_color: Optional[Tuple[int, int, int]] = None,
+    ):
+        """
+        Args:
+            min_height: 间隔的最小行数，较矮的纯色区域（如段落之间的空行）会被忽略
+            tolerance: 允许的颜色波动
+            gap_color: 间隔颜色 (B, G, R)，默认任意颜色
+        """
+        self.min_height = min_height
+        self.tolerance = tolerance
+        self.gap_color = gap_color
+        self.rows = 0  # 已输入的行数
+        self.open_start: Optional[int] = None  # 延续到当前条带末尾的间隔起点
+
+    def feed(self, strip: np.ndarray) -> List[Tuple[int, int]]:
+        """输入下一个条带，返回已经结束的间隔 [start, end)"""
+        start_y = self.rows
+        self.rows += strip.shape[0]
+        runs = find_runs(
+            uniform_rows(strip, self.tolerance, self.gap_color), offset=start_y
+        )
+
+        gaps = []
+        if self.open_start is not None:
+            if runs and runs[0][0] == start_y:
+                # 上一个条带末尾的间隔在本条带继续
+                runs[0] = (self.open_start, runs[0][1])
+            else:
+                gaps.append((self.open_start, start_y))
+            self.open_start = None
+        if runs and runs[-1][1] == self.rows:
+            # 间隔可能延续到下一个条带，暂不输出
+            self.open_start = runs.pop()[0]
+        gaps.extend(runs)
+        return [gap for gap in gaps if gap[1] - gap[0] >= self.min_height]
+
+    def finish(self) -> List[Tuple[int, int]]:
+        """图片结束，输出延续到底部的间隔"""
+        gaps = []
+        if self.open_start is not None:
+            if self.rows - self.open_start >= self.min_height:
+                gaps.append((self.open_start, self.rows))
+            self.open_start = None
+        return gaps
+
+    def detect(self, image: np.ndarray) -> List[Tuple[int, int]]:
+        """检测整幅图片中的间隔"""
+        self.rows = 0
+        self.open_start = None
+        return self.feed(image) + self.finish()
+
+
+def gap_split_points(
+    gaps: List[Tuple[int, int]], height: int
+) -> Tuple[List[int], Dict[int, int]]:
+    """
+    把间隔转换为分割点
+
+    分割点位于间隔的起点，下一页去除整个间隔；
+    贴着图片顶部或底部的间隔不作为分割点。
+
+    Returns:
+        (分割点列表（含起点 0 和终点 height）, 分割点 -> 需要去除的行数)
+    """
+    split_points = [0]
+    trims = {}
+    for start, end in gaps:
+        if start > 0 and end < height:
+            split_points.append(start)
+            trims[start] = end - start
+    split_points.append(height)
+    return split_points, trims
@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+from typing import Tuple
+import cv2
+import numpy as np
+from PIL import Image
+
+
+def decode_image(file_path: str) -> np.ndarray:
+    """
+    解码图片为 BGR 格式的 numpy 数组（只解码一次）
+
+    使用 np.fromfile + cv2.imdecode 读取，兼容包含中文的路径；
+    OpenCV 无法解码的格式（如 GIF）回退到 PIL。
+    """
+    data = np.fromfile(file_path, dtype=np.uint8)
+    pixels = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    del data  # 尽早释放压缩数据
+
+    if pixels is None:
+        with Image.open(file_path) as img:
+            pixels = np.array(img.convert("RGB"))
+        # 原地转换颜色通道，避免额外的整图拷贝
+        cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR, dst=pixels)
+
+    return pixels
+
+
+@dataclass
+class SharedImage:
+    """解码后的图片句柄，在 ImageProcessor 与 ImageSplitter 之间共享"""
+
+    path: str
+    pixels: np.ndarray  # BGR 格式
+
+    @classmethod
+    def load(cls, file_path: str) -> "SharedImage":
+        """从文件加载图片"""
+        return cls(path=file_path, pixels=decode_image(file_path))
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    def crop_width(self, width_range: Tuple[int, int]) -> np.ndarray:
+        """按宽度范围裁剪，返回零拷贝视图"""
+        start_x, end_x = width_range
+        return self.pixels[:, start_x:end_x]
+
+    def template(
+        self, width_range: Tuple[int, int], feature_range: Tuple[int, int]
+    ) -> np.ndarray:
+        """提取特征模板，返回零拷贝视图"""
+        start_y, end_y = feature_range
+        return self.crop_width(width_range)[start_y:end_y]
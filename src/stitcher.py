@@ -0,0 +1,233 @@
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+from loguru import logger
+from src.shared_image import decode_image
+from src.strip_source import StripSource
+
+
+def sequence_sort_key(path: Path) -> list:
+    """按文件名中的数字排序（shot_2 排在 shot_10 前面）"""
+    return [
+        int(part) if part.isdigit() else part.lower()
+        for part in re.split(r"(\d+)", Path(path).name)
+    ]
+
+
+def row_hashes_for_overlap(
+    image: np.ndarray, columns: int = 32, quantize: int = 4
+) -> np.ndarray:
+    """
+    计算每一行的粗量化哈希，用于寻找相邻截图的重叠区域
+
+    每行先按列分块求均值（cv2.resize 的 INTER_AREA 只在水平方向缩小），
+    再粗量化，能容忍轻微的压缩噪声；最后把每行的字节哈希为一个整数。
+    与 incremental.row_hashes 的逐像素 CRC32 不同，结果只在本进程内有效，不能保存。
+
+    Returns:
+        长度为 H 的 int64 数组
+    """
+    height, width = image.shape[:2]
+    blocks = cv2.resize(
+        image, (min(columns, width), height), interpolation=cv2.INTER_AREA
+    )
+    blocks = (blocks // quantize).reshape(height, -1)
+    return np.array([hash(row.tobytes()) for row in blocks], dtype=np.int64)
+
+
+def _static_rows(previous: np.ndarray, current: np.ndarray) -> Tuple[int, int]:
+    """两张截图顶部和底部位置不变的行数（固定的导航栏、底栏）"""
+    if len(previous) != len(current):
+        return 0, 0
+    same = previous == current
+    if same.all():
+        return len(same), 0
+    top = int(np.argmin(same))
+    bottom = int(np.argmin(same[::-1]))
+    return top, bottom
+
+
+def find_scroll_offset(
+    previous: np.ndarray,
+    current: np.ndarray,
+    min_rows: int = 32,
+    min_match: float = 0.98,
+) -> Optional[int]:
+    """
+    寻找两张相邻截图内容区域之间的滚动距离
+
+    尝试每个偏移，比较重叠部分的行签名，取一致比例最高的偏移（并列时取重叠最多的）。
+    每个偏移只是一次一维数组比较，不需要二维搜索。
+    只要求达到 min_match 就取第一个偏移的话，重复的文字行或空白区域
+    可能在更大的重叠处“差不多一致”，所以要比较所有偏移。
+
+    Args:
+        previous, current: 两张截图内容区域（去掉固定的顶栏和底栏）的行签名
+        min_rows: 重叠部分至少需要的行数
+        min_match: 重叠部分中签名一致的行所占的最低比例（容忍少量噪声）
+
+    Returns:
+        滚动距离（当前截图第 y 行对应上一张的第 y + offset 行），没有找到时为 None
+    """
+    best, best_key = None, (min_match, 0)
+    for offset in range(1, len(previous) - min_rows + 1):
+        overlap = min(len(previous) - offset, len(current))
+        if overlap < min_rows:
+            break
+        same = np.count_nonzero(
+            previous[offset : offset + overlap] == current[:overlap]
+        )
+        key = (same / overlap, overlap)
+        if key >= best_key:
+            best, best_key = offset, key
+    return best
+
+
+@dataclass
+class Segment:
+    """拼接结果中来自某张截图的一段行"""
+
+    shot: int  # 截图序号
+    start_y: int  # 在截图中的起始行
+    end_y: int  # 结束行（不含）
+
+    @property
+    def height(self) -> int:
+        return self.end_y - self.start_y
+
+
+class StitchedSource(StripSource):
+    """
+    由多张有重叠的截图拼接而成的虚拟长图
+
+    只记录每段行来自哪张截图，读取条带时才逐张解码，
+    同一时间只有一张截图在内存中，不会生成巨大的中间图片。
+    """
+
+    def __init__(self, paths: Sequence[str], segments: List[Segment], width: int):
+        self.paths = [str(p) for p in paths]
+        self.segments = segments
+        self.width = width
+        self.height = sum(segment.height for segment in segments)
+
+    def iter_strips(self, strip_height: int) -> Iterator[Tuple[int, np.ndarray]]:
+        pending = []  # 尚未凑满一个条带的行
+        pending_rows = 0
+        y = 0
+        shot, pixels = None, None
+        for segment in self.segments:
+            if segment.shot != shot:
+                shot, pixels = segment.shot, decode_image(self.paths[segment.shot])
+            rows = pixels[segment.start_y : segment.end_y]
+            while rows.shape[0]:
+                take = min(strip_height - pending_rows, rows.shape[0])
+                pending.append(rows[:take])
+                pending_rows += take
+                rows = rows[take:]
+                if pending_rows == strip_height:
+                    yield y, np.concatenate(pending)
+                    y += pending_rows
+                    pending, pending_rows = [], 0
+        if pending:
+            yield y, np.concatenate(pending)
+
+
+class Stitcher:
+    """
+    拼接一组按滚动顺序截取、相邻之间有重叠的截图
+
+    每张截图只解码一次计算行签名，之后只保留签名；
+    相邻截图的重叠由行签名的一维匹配确定，顶部和底部固定不动的行
+    （导航栏、底栏）只保留一份：顶栏取自第一张，底栏取自最后一张。
+    """
+
+    def __init__(
+        self,
+        columns: int = 32,
+        quantize: int = 4,
+        min_rows: int = 32,
+        min_match: float = 0.98,
+        width_range: Optional[Tuple[int, int]] = None,
+    ):
+        """
+        Args:
+            columns: 行签名的列分块数
+            quantize: 行签名的量化步长
+            min_rows: 判定重叠所需的最少行数
+            min_match: 重叠部分中签名一致的行所占的最低比例
+            width_range: 只用该宽度范围计算签名（排除会随滚动变化的滚动条等），默认全宽
+        """
+        self.columns = columns
+        self.quantize = quantize
+        self.min_rows = min_rows
+        self.min_match = min_match
+        self.width_range = width_range
+
+    def _row_hashes(self, pixels: np.ndarray) -> np.ndarray:
+        if self.width_range is not None:
+            start_x, end_x = self.width_range
+            pixels = pixels[:, start_x:end_x]
+        return row_hashes_for_overlap(pixels, self.columns, self.quantize)
+
+    def stitch(self, paths: Sequence[str]) -> StitchedSource:
+        """计算拼接方式，返回按需解码的虚拟长图"""
+        if not paths:
+            raise ValueError("没有需要拼接的截图")
+
+        width = None
+        row_hashes: List[np.ndarray] = []
+        for path in paths:
+            pixels = decode_image(str(path))
+            if width is None:
+                width = pixels.shape[1]
+            elif pixels.shape[1] != width:
+                raise ValueError(f"截图宽度不一致: {path}")
+            row_hashes.append(self._row_hashes(pixels))
+            del pixels
+
+        # 跳过与上一张完全相同的截图（滚动到底后多截的几张）
+        shots = [0]
+        for shot in range(1, len(paths)):
+            if np.array_equal(row_hashes[shot], row_hashes[shots[-1]]):
+                logger.warning(f"截图与上一张完全相同，已跳过: {paths[shot]}")
+            else:
+                shots.append(shot)
+
+        # 固定的顶栏和底栏：所有相邻截图中都位置不变的行，
+        # 只比较一对截图时，正文中碰巧相同的行也会被误认为固定
+        pairs = [
+            _static_rows(row_hashes[a], row_hashes[b]) for a, b in zip(shots, shots[1:])
+        ]
+        top = min((t for t, _ in pairs), default=0)
+        bottom = min((b for _, b in pairs), default=0)
+        if top or bottom:
+            logger.info(f"固定的顶栏 {top} 行，底栏 {bottom} 行")
+
+        segments = [Segment(0, 0, len(row_hashes[0]))]
+        for previous_shot, shot in zip(shots, shots[1:]):
+            previous, current = row_hashes[previous_shot], row_hashes[shot]
+            previous_end = len(previous) - bottom
+            offset = find_scroll_offset(
+                previous[top:previous_end],
+                current[top : len(current) - bottom],
+                self.min_rows,
+                self.min_match,
+            )
+            # 上一段的底栏不属于正文，去掉后由当前截图继续
+            last = segments[-1]
+            last.end_y = min(last.end_y, previous_end)
+            if offset is None:
+                logger.warning(f"未找到与上一张截图的重叠，直接拼接: {paths[shot]}")
+                start_y = top
+            else:
+                # 当前截图中与上一张重叠的部分之后才是新内容
+                start_y = max(top, previous_end - offset)
+            segments.append(Segment(shot, start_y, len(current)))
+
+        segments = [segment for segment in segments if segment.height > 0]
+        source = StitchedSource(paths, segments, width)
+        logger.info(f"拼接了 {len(paths)} 张截图，总高度 {source.height} 行")
+        return source
@@ -0,0 +1,186 @@
+import struct
+import zlib
+from collections import deque
+from typing import BinaryIO, Iterator, Optional, Tuple
+import cv2
+import numpy as np
+from PIL import Image
+from src.shared_image import decode_image
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG 颜色类型 -> (PIL 模式, 每像素字节数, 转 BGR 的颜色转换)
+PNG_COLOR_TYPES = {
+    0: ("L", 1, cv2.COLOR_GRAY2BGR),
+    2: ("RGB", 3, cv2.COLOR_RGB2BGR),
+    6: ("RGBA", 4, cv2.COLOR_RGBA2BGR),
+}
+
+
+class StripSource:
+    """按水平条带读取图片的数据源，输出 BGR 格式"""
+
+    width: int
+    height: int
+
+    def iter_strips(self, strip_height: int) -> Iterator[Tuple[int, np.ndarray]]:
+        """从上到下依次生成 (起始行, 条带像素)"""
+        raise NotImplementedError
+
+    def read(self, start_y: int, end_y: int) -> np.ndarray:
+        """读取 [start_y, end_y) 行（默认从顶部顺序解码）"""
+        rows = []
+        for y, strip in self.iter_strips(max(end_y - start_y, 256)):
+            if y >= end_y:
+                break
+            if y + strip.shape[0] > start_y:
+                rows.append(strip[max(start_y - y, 0) : end_y - y])
+        return np.concatenate(rows)
+
+
+class ArrayStripSource(StripSource):
+    """已解码图片的条带视图"""
+
+    def __init__(self, pixels: np.ndarray):
+        self.pixels = pixels
+        self.height, self.width = pixels.shape[:2]
+
+    def iter_strips(self, strip_height: int) -> Iterator[Tuple[int, np.ndarray]]:
+        for y in range(0, self.height, strip_height):
+            yield y, self.pixels[y : y + strip_height]
+
+    def read(self, start_y: int, end_y: int) -> np.ndarray:
+        return self.pixels[start_y:end_y]
+
+
+class PngStripSource(StripSource):
+    """
+    逐条带解码 PNG，内存占用只与条带高度有关
+
+    PNG 的像素数据是一条连续的 zlib 流，每行带一个过滤器字节，
+    且过滤依赖上一行。这里用 zlib 流式解压出过滤后的行，
+    每攒够一个条带，就在前面补上“上一行的原始像素(过滤类型 0)”，
+    交给 PIL 的 PNG 解码器还原。这样不受 PIL 解压炸弹限制，也不需要整图内存。
+    """
+
+    READ_SIZE = 1 << 20  # 每次从文件读取的字节数
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        with open(file_path, "rb") as f:
+            header = self._read_header(f)
+        if header is None:
+            raise ValueError(f"不支持流式解码的 PNG: {file_path}")
+        self.width, self.height, self.mode, self.bpp, self.color_code = header
+
+    @staticmethod
+    def _read_header(f: BinaryIO):
+        """解析 IHDR，只支持 8 位、非隔行的灰度/RGB/RGBA 图片"""
+        if f.read(8) != PNG_SIGNATURE:
+            return None
+        length, chunk_type = struct.unpack(">I4s", f.read(8))
+        if chunk_type != b"IHDR":
+            return None
+        width, height, bit_depth, color_type, _, _, interlace = struct.unpack(
+            ">IIBBBBB", f.read(length)
+        )
+        if bit_depth != 8 or interlace or color_type not in PNG_COLOR_TYPES:
+            return None
+        mode, bpp, color_code = PNG_COLOR_TYPES[color_type]
+        return width, height, mode, bpp, color_code
+
+    @classmethod
+    def supports(cls, file_path: str) -> bool:
+        """判断文件是否可以流式解码"""
+        with open(file_path, "rb") as f:
+            return cls._read_header(f) is not None
+
+    def _iter_filtered_data(self) -> Iterator[bytes]:
+        """依次生成解压后的过滤行数据（每块大小有上限）"""
+        decompressor = zlib.decompressobj()
+        with open(self.file_path, "rb") as f:
+            f.seek(len(PNG_SIGNATURE))
+            while True:
+                length, chunk_type = struct.unpack(">I4s", f.read(8))
+                if chunk_type == b"IEND":
+                    break
+                if chunk_type != b"IDAT":
+                    f.seek(length + 4, 1)  # 跳过数据和 CRC
+                    continue
+                remaining = length
+                while remaining:
+                    data = f.read(min(remaining, self.READ_SIZE))
+                    remaining -= len(data)
+                    while data:
+                        yield decompressor.decompress(data, self.READ_SIZE)
+                        data = decompressor.unconsumed_tail
+                f.seek(4, 1)  # 跳过 CRC
+        yield decompressor.flush()
+
+    def iter_strips(self, strip_height: int) -> Iterator[Tuple[int, np.ndarray]]:
+        stride = 1 + self.width * self.bpp  # 每行：过滤器字节 + 像素
+        previous_row = bytes(self.width * self.bpp)  # 第一行之前视为全 0
+        buffer = bytearray()
+        y = 0
+
+        for data in self._iter_filtered_data():
+            buffer += data
+            # 攒够一个条带（或剩余的全部行）就解码输出
+            while y < self.height:
+                rows = min(strip_height, self.height - y)
+                if len(buffer) < rows * stride:
+                    break
+                strip, previous_row = self._decode_rows(
+                    previous_row, buffer[: rows * stride], rows
+                )
+                del buffer[: rows * stride]
+                yield y, strip
+                y += rows
+            if y >= self.height:
+                return
+
+        raise ValueError(f"PNG 数据不完整: {self.file_path}")
+
+    def _decode_rows(self, previous_row: bytes, filtered: bytearray, rows: int):
+        """解码若干过滤行，返回 (BGR 条带, 最后一行原始像素)"""
+        data = b"\x00" + previous_row + bytes(filtered)
+        image = Image.frombytes(
+            self.mode, (self.width, rows + 1), zlib.compress(data, 0), "zip", self.mode
+        )
+        pixels = np.asarray(image)[1:]
+        last_row = pixels[-1].tobytes()
+        return cv2.cvtColor(pixels, self.color_code), last_row
+
+
+def open_strip_source(file_path: str) -> StripSource:
+    """打开条带数据源：支持的 PNG 流式解码，其他格式整图解码"""
+    if PngStripSource.supports(file_path):
+        return PngStripSource(file_path)
+    return ArrayStripSource(decode_image(file_path))
+
+
+class RowBuffer:
+    """缓存最近读入的条带，用于拼出跨越多个条带的页面"""
+
+    def __init__(self):
+        self.strips: deque = deque()  # (起始行, 像素)
+        self.end = 0  # 已缓存的最后一行（不含）
+
+    def append(self, rows: np.ndarray):
+        self.strips.append((self.end, rows))
+        self.end += rows.shape[0]
+
+    def take(self, start_y: int, end_y: Optional[int] = None) -> np.ndarray:
+        """取出 [start_y, end_y) 行"""
+        end_y = self.end if end_y is None else end_y
+        parts = [
+            rows[max(start_y - y, 0) : end_y - y]
+            for y, rows in self.strips
+            if y < end_y and y + rows.shape[0] > start_y
+        ]
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def discard_before(self, y: int):
+        """丢弃 y 之前已不再需要的条带"""
+        while self.strips and self.strips[0][0] + self.strips[0][1].shape[0] <= y:
+            self.strips.popleft()
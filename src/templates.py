@@ -0,0 +1,174 @@
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Tuple
+import cv2
+import numpy as np
+from loguru import logger
+from src.matching import SignatureStats, signature_stats
+from src.shared_image import decode_image
+
+# 模板名称只允许用作文件名的字符
+TEMPLATE_NAME_PATTERN = re.compile(r"^[\w.-]+$")
+
+
+@dataclass
+class BoundaryTemplate:
+    """
+    保存下来的边界模板：模板像素和处理同类文档所需的参数
+
+    同一个文档网站的截图使用相同的分割线，保存一次即可在后续任务中
+    直接使用，不需要每次重新框选特征区域。
+    """
+
+    name: str
+    pixels: np.ndarray  # BGR 模板，宽度等于宽度裁剪范围
+    width_range: Optional[Tuple[int, int]]  # 为 None 时自动检测
+    threshold: float = 0.9
+    match_method: str = "template"
+    metadata: dict = field(default_factory=dict)
+    # 预先计算的行签名统计量，供 "signature" 匹配方法直接使用
+    signature: Optional[SignatureStats] = None
+
+    @classmethod
+    def from_image(
+        cls,
+        name: str,
+        image: np.ndarray,
+        width_range: Tuple[int, int],
+        feature_range: Tuple[int, int],
+        **kwargs,
+    ) -> "BoundaryTemplate":
+        """从图片中截取特征区域创建模板"""
+        start_x, end_x = width_range
+        start_y, end_y = feature_range
+        pixels = np.ascontiguousarray(image[start_y:end_y, start_x:end_x])
+        if pixels.size == 0:
+            raise ValueError("特征区域为空")
+        metadata = kwargs.pop("metadata", {})
+        metadata.setdefault("feature_range", list(feature_range))
+        return cls(name, pixels, tuple(width_range), metadata=metadata, **kwargs)
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    def match_options(self) -> dict:
+        """传给 compute_match_scores 的参数（带上缓存的模板统计量）"""
+        if self.match_method == "signature":
+            if self.signature is None:
+                self.signature = signature_stats(self.pixels)
+            return {"stats": self.signature}
+        return {}
+
+
+class TemplateLibrary:
+    """
+    磁盘上的模板库，每个模板保存为三个文件：
+
+    - <名称>.png: 模板像素
+    - <名称>.json: 宽度范围、阈值、匹配方法和元数据
+    - <名称>.npz: 预先计算的行签名统计量
+
+    只缓存 "signature" 方法的模板统计量；默认的 "template" 方法由
+    cv2.matchTemplate 自行计算模板的均值和范数，无法传入预先计算的值。
+    """
+
+    def __init__(self, root: str = "templates"):
+        self.root = Path(root)
+
+    def names(self) -> List[str]:
+        """列出库中所有模板的名称"""
+        if not self.root.is_dir():
+            return []
+        return sorted(p.stem for p in self.root.glob("*.json"))
+
+    def __contains__(self, name: str) -> bool:
+        return bool(TEMPLATE_NAME_PATTERN.match(name)) and (
+            self._path(name, ".json").is_file()
+        )
+
+    def save(self, template: BoundaryTemplate) -> Path:
+        """保存模板（同名模板会被覆盖），返回元数据文件路径"""
+        if not TEMPLATE_NAME_PATTERN.match(template.name):
+            raise ValueError(
+                f"模板名称只能包含字母、数字、下划线、点和横线: {template.name}"
+            )
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        info = {
+            "name": template.name,
+            "width_range": list(template.width_range),
+            "threshold": template.threshold,
+            "match_method": template.match_method,
+            "height": template.pixels.shape[0],
+            "width": template.pixels.shape[1],
+            "metadata": {
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                **template.metadata,
+            },
+        }
+
+        ok, buffer = cv2.imencode(".png", template.pixels)
+        if not ok:
+            raise ValueError(f"模板编码失败: {template.name}")
+        if template.signature is None:
+            template.signature = signature_stats(template.pixels)
+
+        # 先写临时文件再改名，元数据最后写入，读到元数据时其他文件一定完整
+        name = template.name
+        self._write_atomic(self._path(name, ".png"), buffer.tobytes())
+        stats_path = self._path(name, ".npz")
+        with open(stats_path.with_name(stats_path.name + ".tmp"), "wb") as f:
+            np.savez(
+                f,
+                signature=template.signature.signature,
+                norm2=template.signature.norm2,
+            )
+        os.replace(f.name, stats_path)
+        info_path = self._path(name, ".json")
+        self._write_atomic(
+            info_path, json.dumps(info, ensure_ascii=False, indent=2).encode("utf-8")
+        )
+        logger.info(f"模板已保存: {info_path}")
+        return info_path
+
+    def _path(self, name: str, suffix: str) -> Path:
+        # 名称中可能带点，不能用 with_suffix
+        return self.root / f"{name}{suffix}"
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes):
+        temp_path = path.with_name(path.name + ".tmp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+
+    def load(self, name: str) -> BoundaryTemplate:
+        """按名称读取模板"""
+        if name not in self:
+            raise KeyError(f"模板不存在: {name}")
+        info = json.loads(self._path(name, ".json").read_text(encoding="utf-8"))
+        pixels = decode_image(str(self._path(name, ".png")))
+
+        signature = None
+        if self._path(name, ".npz").is_file():
+            with np.load(self._path(name, ".npz")) as data:
+                signature = SignatureStats(data["signature"], float(data["norm2"]))
+
+        return BoundaryTemplate(
+            name=info["name"],
+            pixels=pixels,
+            width_range=tuple(info["width_range"]),
+            threshold=info["threshold"],
+            match_method=info["match_method"],
+            metadata=info["metadata"],
+            signature=signature,
+        )
+
+    def delete(self, name: str):
+        """删除模板"""
+        for suffix in (".json", ".png", ".npz"):
+            self._path(name, suffix).unlink(missing_ok=True)
@@ -0,0 +1,123 @@
+import os
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+from typing import Tuple
+import cv2
+import numpy as np
+from PIL import Image
+from loguru import logger
+from src.match_cache import file_digest
+from src.shared_image import SharedImage
+
+
+class TileCache:
+    """
+    按需生成的缩小预览图块
+
+    整幅长截图按显示宽度缩小后切成高度固定的图块，只在需要显示时生成，
+    生成后保存到磁盘（按文件内容哈希分目录），再次打开同一张图片时直接读取。
+    内存中只保留最近使用的少量图块，占用与图片高度无关。
+    """
+
+    def __init__(
+        self,
+        image: SharedImage,
+        display_width: int = 800,
+        tile_height: int = 512,
+        root: str = "cache/tiles",
+        memory_tiles: int = 8,
+        max_images: int = 20,
+    ):
+        """
+        Args:
+            image: 已解码的共享图片
+            display_width: 显示宽度，较窄的图片不放大
+            tile_height: 每个图块的显示高度
+            root: 磁盘缓存目录
+            memory_tiles: 内存中保留的图块数量
+            max_images: 磁盘上保留的图片数量，超出时删除最久未使用的
+        """
+        self.image = image
+        self.scale_ratio = min(1.0, display_width / image.width)
+        self.display_width = max(1, round(image.width * self.scale_ratio))
+        self.display_height = max(1, round(image.height * self.scale_ratio))
+        self.tile_height = tile_height
+        self.memory_tiles = memory_tiles
+        self.max_images = max_images
+        self.root = Path(root)
+        self.tile_dir = self.root / (
+            f"{file_digest(image.path)}-{self.display_width}x{tile_height}"
+        )
+        self._tiles: "OrderedDict[int, Image.Image]" = OrderedDict()
+        if self.tile_dir.is_dir():
+            os.utime(self.tile_dir)  # 标记为最近使用
+
+    @property
+    def tile_count(self) -> int:
+        return -(-self.display_height // self.tile_height)
+
+    def tile_range(self, top: float, bottom: float) -> range:
+        """显示坐标 [top, bottom) 覆盖的图块序号"""
+        first = max(0, int(top) // self.tile_height)
+        last = min(self.tile_count, int(bottom) // self.tile_height + 1)
+        return range(first, last)
+
+    def tile(self, index: int) -> Image.Image:
+        """获取图块（RGB），依次查找内存、磁盘，都没有时从原图生成"""
+        if index in self._tiles:
+            self._tiles.move_to_end(index)
+            return self._tiles[index]
+
+        path = self.tile_dir / f"{index}.png"
+        pixels = cv2.imread(str(path)) if path.is_file() else None
+        if pixels is None:
+            pixels = self._render(index)
+            self._save(path, pixels)
+        tile = Image.fromarray(cv2.cvtColor(pixels, cv2.COLOR_BGR2RGB))
+
+        self._tiles[index] = tile
+        while len(self._tiles) > self.memory_tiles:
+            self._tiles.popitem(last=False)
+        return tile
+
+    def _render(self, index: int) -> np.ndarray:
+        """从原图缩小生成图块（INTER_AREA 缩小质量好且比 LANCZOS 快得多）"""
+        top, bottom = self._display_rows(index)
+        source_top = int(top / self.scale_ratio)
+        source_bottom = min(self.image.height, int(bottom / self.scale_ratio))
+        rows = self.image.pixels[source_top:source_bottom]
+        if self.scale_ratio == 1.0:
+            return np.ascontiguousarray(rows)
+        return cv2.resize(
+            rows, (self.display_width, bottom - top), interpolation=cv2.INTER_AREA
+        )
+
+    def _display_rows(self, index: int) -> Tuple[int, int]:
+        top = index * self.tile_height
+        return top, min(top + self.tile_height, self.display_height)
+
+    def _save(self, path: Path, pixels: np.ndarray):
+        """保存图块，写入失败只影响下次打开的速度"""
+        try:
+            if not self.tile_dir.is_dir():
+                self.tile_dir.mkdir(parents=True, exist_ok=True)
+                self._evict()
+            ok, buffer = cv2.imencode(".png", pixels, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            if ok:
+                temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                temp_path.write_bytes(buffer.tobytes())
+                os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"保存预览图块失败: {path}: {e}")
+
+    def _evict(self):
+        """只保留最近使用的 max_images 张图片的图块"""
+        os.utime(self.tile_dir)
+        directories = sorted(
+            (p for p in self.root.iterdir() if p.is_dir()),
+            key=lambda p: p.stat().st_mtime_ns,
+            reverse=True,
+        )
+        for directory in directories[self.max_images :]:
+            shutil.rmtree(directory, ignore_errors=True)
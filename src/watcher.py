@@ -0,0 +1,419 @@
+"""
+监视目录的后台服务（无需图形界面）
+
+截图保存到监视目录后，按文件名规则选择模板和宽度范围，放入持久化的任务队列，
+由有上限的进程池处理；失败的任务按退避时间重试，服务重启后继续处理未完成的任务。
+
+示例:
+    python -m src.watcher inbox/ --rules rules.json --workers 2 -o output
+
+rules.json 是规则列表，按顺序使用第一条匹配文件名的规则:
+    [
+        {"pattern": "siteA_*.png", "template": "siteA"},
+        {"pattern": "*.png", "detector": "projection", "width": [100, 1100]}
+    ]
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import signal
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from src.image_splitter import DETECTORS, ImageSplitter
+from src.match_cache import MatchCache
+from src.matching import MATCH_METHODS
+from src.templates import BoundaryTemplate, TemplateLibrary
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    path TEXT PRIMARY KEY,
+    signature TEXT NOT NULL,     -- 文件大小和修改时间，文件被覆盖后重新处理
+    rule INTEGER NOT NULL,       -- 使用的规则序号
+    status TEXT NOT NULL,        -- pending / running / done / failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    job_dir TEXT,
+    error TEXT,
+    updated REAL NOT NULL
+)
+"""
+
+
+class JobQueue:
+    """保存在 SQLite 中的任务队列，服务重启后不会丢失"""
+
+    def __init__(self, db_path: str):
+        self.db = sqlite3.connect(db_path)
+        self.db.execute(SCHEMA)
+        # 上次退出时正在处理的任务重新排队
+        self.db.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'")
+        self.db.commit()
+
+    def signature(self, path: str) -> Optional[str]:
+        row = self.db.execute(
+            "SELECT signature FROM jobs WHERE path = ?", (path,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def add(self, path: str, signature: str, rule: int):
+        """加入新任务（文件被覆盖时重置已有的任务）"""
+        self.db.execute(
+            "INSERT OR REPLACE INTO jobs (path, signature, rule, status, updated) "
+            "VALUES (?, ?, ?, 'pending', ?)",
+            (path, signature, rule, time.time()),
+        )
+        self.db.commit()
+
+    def pending_count(self) -> int:
+        return self.db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'pending'"
+        ).fetchone()[0]
+
+    def take(self, limit: int) -> List[Tuple[str, int, int]]:
+        """取出最多 limit 个到期的任务并标记为处理中，返回 (路径, 规则, 已尝试次数)"""
+        rows = self.db.execute(
+            "SELECT path, rule, attempts FROM jobs "
+            "WHERE status = 'pending' AND next_attempt <= ? "
+            "ORDER BY updated LIMIT ?",
+            (time.time(), limit),
+        ).fetchall()
+        self.db.executemany(
+            "UPDATE jobs SET status = 'running', updated = ? WHERE path = ?",
+            [(time.time(), path) for path, _, _ in rows],
+        )
+        self.db.commit()
+        return rows
+
+    def finish(self, path: str, job_dir: str, attempts: int):
+        self.db.execute(
+            "UPDATE jobs SET status = 'done', attempts = ?, job_dir = ?, error = NULL, "
+            "updated = ? WHERE path = ?",
+            (attempts, job_dir, time.time(), path),
+        )
+        self.db.commit()
+
+    def fail(self, path: str, error: str, attempts: int, retry_delay: Optional[float]):
+        """记录失败；retry_delay 为 None 时不再重试"""
+        if retry_delay is None:
+            status, next_attempt = "failed", 0.0
+        else:
+            status, next_attempt = "pending", time.time() + retry_delay
+        self.db.execute(
+            "UPDATE jobs SET status = ?, attempts = ?, next_attempt = ?, error = ?, "
+            "updated = ? WHERE path = ?",
+            (status, attempts, next_attempt, error, time.time(), path),
+        )
+        self.db.commit()
+
+    def release(self, paths: List[str]):
+        """服务停止时把未完成的任务放回队列"""
+        self.db.executemany(
+            "UPDATE jobs SET status = 'pending' WHERE path = ? AND status = 'running'",
+            [(path,) for path in paths],
+        )
+        self.db.commit()
+
+
+def job_options(
+    spec: dict,
+    library: TemplateLibrary,
+    output_dir: str,
+    match_cache: Optional[MatchCache] = None,
+    workers: int = 1,
+    templates: Optional[List[BoundaryTemplate]] = None,
+) -> dict:
+    """
+    根据规则生成 ImageSplitter 的参数（命令行、监视目录和 HTTP 接口共用）
+
+    spec 的键与命令行参数同名: width、feature、template（名称或名称列表）、
+    threshold、method、detector、format、dedup，都可以省略。
+    参数来自规则文件或 HTTP 请求，类型不对时在这里抛出 TypeError / ValueError，
+    而不是到工作进程中才失败。
+
+    Args:
+        workers: 同时运行的进程数，平分编码线程
+        templates: 已经解析好的模板，传入后不再按 spec["template"] 从模板库加载
+    """
+    if templates is None:
+        names = spec.get("template") or []
+        templates = [
+            library.load(name)
+            for name in ([names] if isinstance(names, str) else names)
+        ]
+    # 规则中的参数优先，其次是第一个模板保存的参数
+    width_range = _int_range(spec.get("width"), "width") or (
+        templates[0].width_range if templates else None
+    )
+    threshold, method = spec.get("threshold"), spec.get("method")
+    if threshold is not None:
+        threshold = float(threshold)
+        if not -1.0 <= threshold <= 1.0:
+            raise ValueError(f"threshold 应在 [-1, 1] 之间: {threshold}")
+    if method is not None and method not in MATCH_METHODS:
+        raise ValueError(f"未知的匹配方法: {method}")
+    detector = spec.get("detector", "template")
+    if detector not in DETECTORS:
+        raise ValueError(f"未知的检测方式: {detector}")
+    dedup = spec.get("dedup")
+    if templates:
+        threshold = templates[0].threshold if threshold is None else threshold
+        method = method or templates[0].match_method
+        for template in templates:
+            template.match_method = method
+    return {
+        "width_range": tuple(width_range) if width_range else None,
+        "feature_range": _int_range(spec.get("feature"), "feature"),
+        "templates": [template.pixels for template in templates],
+        "template_options": [template.match_options() for template in templates],
+        "threshold": 0.9 if threshold is None else threshold,
+        "match_method": method or "template",
+        "detector": detector,
+        "slice_format": spec.get("format", "png"),
+        "dedup_distance": None if dedup is None else int(dedup),
+        "output_dir": output_dir,
+        "match_cache": match_cache,
+        # 多个进程同时运行时，平分编码线程
+        "encode_workers": max(1, (os.cpu_count() or 1) // workers),
+    }
+
+
+def _int_range(value, name: str) -> Optional[Tuple[int, int]]:
+    """把 [start, end] 转换为整数元组，省略时返回 None"""
+    if not value:
+        return None
+    if isinstance(value, str) or len(value) != 2:
+        raise ValueError(f"{name} 应为两个整数 [start, end]: {value!r}")
+    start, end = int(value[0]), int(value[1])
+    if not 0 <= start < end:
+        raise ValueError(f"{name} 范围无效: [{start}, {end}]")
+    return start, end
+
+
+def _ignore_signals():
+    """工作进程忽略中断信号，由主进程等待任务完成后再退出"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+def _process_file(file_path: str, options: dict) -> str:
+    """在工作进程中处理单张图片，返回任务目录"""
+    splitter = ImageSplitter(image_path=file_path, **options)
+    splitter.process()
+    return str(splitter.job_dir)
+
+
+class FolderWatcher:
+    """
+    轮询监视目录，把新截图交给进程池处理
+
+    文件大小和修改时间在两次扫描之间不变才入队，避免处理尚未写完的文件。
+    同时处理的任务数不超过 max_running；队列中等待的任务达到 max_queued 时
+    暂停接收新文件（背压），文件留在目录中，队列有空位后再入队。
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        rules: List[dict],
+        db_path: str,
+        output_dir: str = "output",
+        templates_dir: str = "templates",
+        match_cache: Optional[MatchCache] = None,
+        workers: int = 1,
+        max_queued: int = 100,
+        max_attempts: int = 3,
+        retry_delay: float = 30.0,
+        interval: float = 2.0,
+    ):
+        """
+        Args:
+            directory: 监视的目录
+            rules: 文件名规则，见模块说明
+            db_path: 任务队列的 SQLite 数据库
+            output_dir: 输出根目录
+            templates_dir: 模板库目录
+            match_cache: 匹配结果缓存（写入是原子的，多个进程可以共用）
+            workers: 工作进程数
+            max_queued: 队列中最多等待的任务数
+            max_attempts: 每个任务最多尝试的次数
+            retry_delay: 第一次重试的等待秒数，之后每次加倍
+            interval: 扫描间隔（秒）
+        """
+        self.directory = Path(directory)
+        self.rules = rules
+        self.queue = JobQueue(db_path)
+        self.output_dir = output_dir
+        self.library = TemplateLibrary(templates_dir)
+        self.match_cache = match_cache
+        self.workers = workers
+        self.max_running = workers * 2  # 进程池中排队的任务也算在内
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.interval = interval
+        self.running: Dict[Future, Tuple[str, int]] = {}  # future -> (路径, 已尝试次数)
+        self._unstable: Dict[str, str] = {}  # 上次扫描时看到的文件签名
+        self._stopping = False
+
+    def match_rule(self, name: str) -> Optional[int]:
+        """返回第一条匹配文件名的规则序号"""
+        for i, rule in enumerate(self.rules):
+            if fnmatch.fnmatch(name, rule.get("pattern", "*")):
+                return i
+        return None
+
+    def scan(self):
+        """扫描目录，把写入完成的新文件加入队列"""
+        if self.queue.pending_count() >= self.max_queued:
+            return  # 背压：队列已满，文件留在目录中等待下次扫描
+
+        for path in sorted(self.directory.iterdir()):
+            if path.suffix.lower() not in IMAGE_SUFFIXES or not path.is_file():
+                continue
+            rule = self.match_rule(path.name)
+            if rule is None:
+                continue
+            stat = path.stat()
+            signature = f"{stat.st_size}:{stat.st_mtime_ns}"
+            key = str(path)
+            if self.queue.signature(key) == signature:
+                continue  # 已经入队或处理过
+            if self._unstable.get(key) != signature:
+                self._unstable[key] = signature  # 可能还在写入，下次扫描再确认
+                continue
+
+            del self._unstable[key]
+            self.queue.add(key, signature, rule)
+            logger.info(f"新任务: {path.name}（规则 {rule}）")
+            if self.queue.pending_count() >= self.max_queued:
+                logger.warning("任务队列已满，暂停接收新文件")
+                return
+
+    def dispatch(self, executor: ProcessPoolExecutor):
+        """在进程池有空位时提交到期的任务"""
+        free = self.max_running - len(self.running)
+        if free <= 0:
+            return
+        for path, rule, attempts in self.queue.take(free):
+            try:
+                options = job_options(
+                    self.rules[rule],
+                    self.library,
+                    self.output_dir,
+                    self.match_cache,
+                    self.workers,
+                )
+            except Exception as e:
+                self._failed(path, attempts + 1, e)
+                continue
+            future = executor.submit(_process_file, path, options)
+            self.running[future] = (path, attempts + 1)
+
+    def collect(self, timeout: float):
+        """等待并记录已完成的任务"""
+        if not self.running:
+            time.sleep(timeout)
+            return
+        done, _ = wait(self.running, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            path, attempts = self.running.pop(future)
+            try:
+                job_dir = future.result()
+            except Exception as e:
+                self._failed(path, attempts, e)
+            else:
+                self.queue.finish(path, job_dir, attempts)
+                logger.success(f"处理完成: {Path(path).name} -> {job_dir}")
+
+    def _failed(self, path: str, attempts: int, error: Exception):
+        if attempts < self.max_attempts:
+            delay = self.retry_delay * 2 ** (attempts - 1)
+            logger.warning(f"处理失败，{delay:.0f} 秒后重试: {path}: {error}")
+        else:
+            delay = None
+            logger.error(f"处理失败，已放弃: {path}: {error}")
+        self.queue.fail(path, str(error), attempts, delay)
+
+    def stop(self, *_):
+        logger.info("正在停止，等待处理中的任务完成...")
+        self._stopping = True
+
+    def run(self):
+        """运行直到收到 SIGINT / SIGTERM"""
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        logger.info(f"开始监视: {self.directory}")
+        with ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_ignore_signals
+        ) as executor:
+            while not self._stopping:
+                self.scan()
+                self.dispatch(executor)
+                self.collect(self.interval)
+            # 还没开始的任务放回队列，已经开始的等待完成
+            for future, (path, _) in list(self.running.items()):
+                if future.cancel():
+                    self.running.pop(future)
+                    self.queue.release([path])
+            while self.running:
+                self.collect(self.interval)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.watcher", description="监视目录，自动分割新截图"
+    )
+    parser.add_argument("directory", help="监视的目录")
+    parser.add_argument("--rules", required=True, help="文件名规则 (JSON)")
+    parser.add_argument("-o", "--output", default="output", help="输出根目录")
+    parser.add_argument("--templates-dir", default="templates", help="模板库目录")
+    parser.add_argument("--db", help="任务队列数据库，默认为监视目录下的 .watcher.db")
+    parser.add_argument("--cache-dir", default="cache/match", help="匹配结果缓存目录")
+    parser.add_argument("--no-cache", action="store_true", help="不使用匹配结果缓存")
+    parser.add_argument("--workers", type=int, default=1, help="工作进程数")
+    parser.add_argument(
+        "--max-queued", type=int, default=100, help="队列中最多等待的任务数"
+    )
+    parser.add_argument("--retries", type=int, default=2, help="失败后的重试次数")
+    parser.add_argument(
+        "--retry-delay", type=float, default=30.0, help="第一次重试前等待的秒数"
+    )
+    parser.add_argument("--interval", type=float, default=2.0, help="扫描间隔（秒）")
+    parser.add_argument("--log-level", default="INFO", help="日志级别")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    rules = json.loads(Path(args.rules).read_text(encoding="utf-8"))
+    watcher = FolderWatcher(
+        args.directory,
+        rules,
+        db_path=args.db or str(Path(args.directory) / ".watcher.db"),
+        output_dir=args.output,
+        templates_dir=args.templates_dir,
+        match_cache=None if args.no_cache else MatchCache(args.cache_dir),
+        workers=max(1, args.workers),
+        max_queued=args.max_queued,
+        max_attempts=args.retries + 1,
+        retry_delay=args.retry_delay,
+        interval=args.interval,
+    )
+    watcher.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
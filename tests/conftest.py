@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+from typing import List, Sequence
+import numpy as np
+
+# 以 python -m pytest 或 pytest 运行时都能导入 src
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.matching import compute_match_scores, pick_split_points
+
+THRESHOLD = 0.9
+
+
+def make_screenshot(
+    separators: Sequence[int],
+    height: int,
+    width: int = 600,
+    separator_height: int = 20,
+    blank_pages: Sequence[int] = (),
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    生成合成的长截图 (BGR)
+
+    白底上是随机长度的深色“文字行”，separators 处画出带彩色标记的分割线。
+    blank_pages 中的页面（按分割线分隔的序号）保持纯白，用于检查纯色区域。
+    """
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    bounds = [0, *separators, height]
+    for page, (top, bottom) in enumerate(zip(bounds, bounds[1:])):
+        if page in blank_pages:
+            continue
+        for y in range(top + 4, bottom - 10, 14):
+            x = int(rng.integers(10, 30))
+            while x < width - 50:
+                word = int(rng.integers(8, 40))
+                image[y : y + 7, x : x + word] = rng.integers(0, 90, size=3)
+                x += word + int(rng.integers(4, 12))
+
+    for y in separators:
+        # 单像素宽的细线和短标记：缩小时对行相位很敏感
+        image[y : y + separator_height] = 235
+        image[y + 1 : y + separator_height : 5] = 90
+        image[y + 3 : y + separator_height : 7] = 160
+        image[y + 2 : y + 5, 8:40] = (200, 80, 60)
+    return image
+
+
+def page_layout(first: int, heights: List[int], separator_height: int):
+    """第一条分割线位于 first，之后每页内容高度依次为 heights"""
+    separators = [first]
+    for page_height in heights:
+        separators.append(separators[-1] + separator_height + page_height)
+    height = separators[-1] + separator_height + heights[-1]
+    return separators, height
+
+
+def split_rows(image, template, method, **options):
+    """与 ImageSplitter 相同的方式从得分中挑选分割点"""
+    scores = compute_match_scores(image, template, method, **options)
+    min_distance = max(1, template.shape[0] // 2)
+    return pick_split_points(scores, THRESHOLD, min_distance, start=0)
@@ -0,0 +1,68 @@
+import threading
+import cv2
+import numpy as np
+from conftest import make_screenshot
+from src.image_processor import ImageProcessor
+
+
+def blocking_processor(tmp_path):
+    """匹配会一直等待 release 的 ImageProcessor，用于检查计算期间的行为"""
+    paths = []
+    for index, separators in enumerate(([200, 520], [300, 700])):
+        path = tmp_path / f"long{index}.png"
+        cv2.imwrite(str(path), make_screenshot(separators, 1000, seed=index))
+        paths.append(str(path))
+
+    processor = ImageProcessor()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    compute = processor._compute_match_scores
+
+    def slow_compute(*args):
+        calls.append(args[0])
+        started.set()
+        release.wait(10)
+        return compute(*args)
+
+    processor._compute_match_scores = slow_compute
+    processor.load_image(paths[0])
+    return processor, paths, started, release, calls
+
+
+def test_computation_does_not_block_ui_calls(tmp_path):
+    processor, paths, started, release, _ = blocking_processor(tmp_path)
+    worker = threading.Thread(target=processor.prepare_match_scores, args=(200, 220))
+    worker.start()
+    assert started.wait(10)
+
+    # 界面线程调整阈值、打开新图片都不需要等待匹配完成
+    assert processor.split_points_at(0.9) == []
+    processor.load_image(paths[1])
+    release.set()
+    worker.join(10)
+
+    # 旧图片的得分不会缓存到新图片上
+    assert processor.match_scores is None
+    assert processor.split_points_at(0.9) == []
+
+
+def test_concurrent_calls_share_one_computation(tmp_path):
+    processor, paths, started, release, calls = blocking_processor(tmp_path)
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(processor.prepare_match_scores(200, 220))
+        )
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    assert started.wait(10)
+    release.set()
+    for thread in threads:
+        thread.join(10)
+
+    assert calls == [paths[0]]
+    assert len(results) == 3
+    assert all(result is results[0] for result in results)
+    assert processor.split_points_at(0.9)[:2] == [200, 520]
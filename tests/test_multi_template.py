@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+import pytest
+from conftest import make_screenshot
+from src.image_splitter import ImageSplitter
+from src.matching import compute_multi_match_scores
+from src.templates import BoundaryTemplate
+
+SEPARATORS = [200, 520, 840]
+
+
+def two_style_screenshot():
+    """第二条分割线换成另一种样式，只有库中的模板能完全匹配"""
+    image = make_screenshot(SEPARATORS, 1100)
+    y = SEPARATORS[1]
+    image[y + 2 : y + 5, 8:40] = 235
+    image[y + 8 : y + 14, 300:400] = (60, 160, 220)
+    return image
+
+
+def library_template(image, method):
+    """模拟模板库中保存的模板：另一条分割线，带有 match_options"""
+    return BoundaryTemplate(
+        name="line",
+        pixels=np.ascontiguousarray(image[SEPARATORS[1] : SEPARATORS[1] + 20]),
+        width_range=(0, image.shape[1]),
+        threshold=0.9,
+        match_method=method,
+    )
+
+
+@pytest.mark.parametrize("method", ["template", "signature"])
+@pytest.mark.parametrize("streaming", [False, True])
+def test_feature_with_library_template(tmp_path, method, streaming):
+    image = two_style_screenshot()
+    path = tmp_path / "long.png"
+    cv2.imwrite(str(path), image)
+    template = library_template(image, method)
+
+    splitter = ImageSplitter(
+        str(path),
+        (0, image.shape[1]),
+        (SEPARATORS[0], SEPARATORS[0] + 20),
+        match_method=method,
+        templates=[template.pixels],
+        template_options=[template.match_options()],
+        streaming=streaming,
+        strip_height=256,
+        save_images=False,
+        output_dir=str(tmp_path / "output"),
+    )
+    pdf_path = splitter.process()
+
+    assert pdf_path is not None
+    assert splitter.template_options == [{}, template.match_options()]
+    # 每页顶部去除 20 行高的分割线
+    starts = [record.start_y for record in splitter.manifest.slices]
+    assert starts == [0, *(y + 20 for y in SEPARATORS)]
+    assert [record.template for record in splitter.manifest.slices] == [None, 0, 1, 0]
+
+
+def test_misaligned_template_options_are_rejected():
+    image = make_screenshot(SEPARATORS, 1100)
+    templates = [image[200:220], image[520:540]]
+    with pytest.raises(ValueError):
+        compute_multi_match_scores(image, templates, "template", [{}])
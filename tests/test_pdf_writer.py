@@ -0,0 +1,73 @@
+import subprocess
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+import cv2
+from src.pdf_writer import EncodedImage, PDFWriter
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 在独立进程中逐页生成 PDF，输出进程的峰值内存 (ru_maxrss, KB)
+PEAK_MEMORY_SCRIPT = """
+import resource, sys
+import cv2, numpy as np
+from pathlib import Path
+from src.pdf_generator import PDFGenerator
+from src.pdf_writer import EncodedImage
+
+pages, output = int(sys.argv[1]), Path(sys.argv[2])
+rng = np.random.default_rng(0)
+pixels = rng.integers(0, 256, size=(600, 400, 3), dtype=np.uint8)
+data = cv2.imencode(".jpg", pixels)[1].tobytes()
+
+def slices():
+    for _ in range(pages):
+        # 每页都是新的对象，写入后仍被引用的话内存会随页数增长
+        yield EncodedImage(bytes(bytearray(data)), "jpeg", 400, 600)
+
+PDFGenerator(None, output.parent).generate(output, slices=slices())
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def peak_memory_kb(pages: int, output: Path) -> int:
+    result = subprocess.run(
+        [sys.executable, "-c", PEAK_MEMORY_SCRIPT, str(pages), str(output)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return int(result.stdout.split()[-1])
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="需要 resource 模块")
+def test_peak_memory_stays_flat_as_page_count_grows(tmp_path):
+    small = peak_memory_kb(200, tmp_path / "small.pdf")
+    large = peak_memory_kb(2000, tmp_path / "large.pdf")
+
+    # 每页约 280 KB，保留全部页面时多出的 1800 页约占 500 MB；
+    # 只保留交叉引用表时增长应远小于 20 MB（reportlab 引擎约增长 45 MB）
+    page_bytes = (tmp_path / "large.pdf").stat().st_size / 2000
+    assert page_bytes > 100_000
+    assert large - small < 20 * 1024
+    assert (tmp_path / "large.pdf").read_bytes().count(b"/Type /Page ") == 2000
+
+
+def test_writer_embeds_png_and_jpeg_pages(tmp_path):
+    pymupdf = pytest.importorskip("pymupdf")
+    rng = np.random.default_rng(1)
+    pixels = rng.integers(0, 256, size=(120, 80, 3), dtype=np.uint8)
+    output = tmp_path / "mixed.pdf"
+    writer = PDFWriter(output)
+    writer.add_image(EncodedImage.from_bytes(cv2.imencode(".png", pixels)[1]))
+    writer.add_image(EncodedImage.from_bytes(cv2.imencode(".jpg", pixels)[1]))
+    writer.add_image(pixels)
+    writer.close()
+
+    document = pymupdf.open(output)
+    assert document.page_count == 3
+    for page in document:
+        (image,) = page.get_images()
+        assert (image[2], image[3]) == (80, 120)
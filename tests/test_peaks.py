@@ -0,0 +1,106 @@
+import cv2
+import numpy as np
+import pytest
+from conftest import make_screenshot
+from src.image_splitter import ImageSplitter
+from src.matching import StreamingPeakPicker, pick_split_points
+
+
+def reference_split_points(scores, threshold, min_distance, start=None):
+    """逐个位置遍历的参考实现：每段连续超过阈值的位置取峰值，再按间距筛选"""
+    peaks = []
+    run = []
+    for y, value in enumerate(scores):
+        if value >= threshold:
+            run.append(y)
+        elif run:
+            peaks.append(max(run, key=lambda p: (scores[p], -p)))
+            run = []
+    if run:
+        peaks.append(max(run, key=lambda p: (scores[p], -p)))
+
+    points = []
+    last = start
+    for peak in peaks:
+        if last is None or peak - last >= min_distance:
+            points.append(peak)
+            last = peak
+    return points
+
+
+def noisy_scores(length, hit_ratio, seed):
+    rng = np.random.default_rng(seed)
+    scores = rng.random(length, dtype=np.float32) * 0.9
+    hits = rng.random(length) < hit_ratio
+    scores[hits] = 0.9 + rng.integers(0, 5, int(hits.sum())) * 0.02
+    return scores
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("start", [None, 0])
+def test_pick_split_points_matches_reference(seed, start):
+    scores = noisy_scores(2000, 0.3 if seed % 2 else 0.02, seed)
+    assert pick_split_points(scores, 0.9, 15, start) == reference_split_points(
+        scores, 0.9, 15, start
+    )
+
+
+def test_chained_candidates_do_not_merge_into_one_point():
+    # 每隔 10 行一段超过阈值的位置，间距小于 min_distance 但整体跨度很长
+    scores = np.zeros(1000, dtype=np.float32)
+    scores[::10] = 0.95
+    points = pick_split_points(scores, 0.9, 15)
+    assert points == list(range(0, 1000, 20))
+
+
+def test_nan_positions_are_ignored():
+    scores = np.full(100, np.nan, dtype=np.float32)
+    scores[40:43] = [0.91, 0.97, 0.93]
+    assert pick_split_points(scores, 0.9, 15) == [41]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_streaming_matches_whole_scores(seed):
+    rng = np.random.default_rng(seed)
+    scores = noisy_scores(3000, 0.3 if seed % 2 else 0.02, seed)
+    tags = rng.integers(0, 3, len(scores))
+    expected = pick_split_points(scores, 0.9, 15, start=0)
+
+    picker = StreamingPeakPicker(0.9, 15, start=0)
+    result = []
+    cuts = np.sort(rng.choice(np.arange(1, len(scores)), 30, replace=False))
+    for begin, end in zip(np.r_[0, cuts], np.r_[cuts, len(scores)]):
+        result += picker.feed(scores[begin:end], int(begin), tags[begin:end])
+    result += picker.finish()
+
+    assert [point for point, _ in result] == expected
+    assert [tag for _, tag in result] == tags[expected].tolist()
+
+
+def test_zero_min_distance_keeps_every_peak():
+    # 1 行高的特征区域得到 min_distance = 0，不能卡在倍增跳转里
+    scores = noisy_scores(2000, 0.3, 7)
+    expected = reference_split_points(scores, 0.9, 1)
+    assert pick_split_points(scores, 0.9, 0) == expected
+
+    picker = StreamingPeakPicker(0.9, 0, start=0)
+    result = picker.feed(scores[:1000], 0) + picker.feed(scores[1000:], 1000)
+    result += picker.finish()
+    assert [point for point, _ in result] == pick_split_points(scores, 0.9, 0, 0)
+
+
+def test_single_row_feature_band(tmp_path):
+    image = make_screenshot([200, 520, 840], 1100)
+    path = tmp_path / "long.png"
+    cv2.imwrite(str(path), image)
+
+    splitter = ImageSplitter(
+        str(path),
+        (0, image.shape[1]),
+        (202, 203),
+        save_images=False,
+        output_dir=str(tmp_path / "output"),
+    )
+    cropped = splitter._crop_width()
+    points = splitter._find_split_points(cropped, splitter._extract_templates(cropped))
+    assert {202, 522, 842} <= set(points)
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from conftest import make_screenshot, page_layout, split_rows
+
+
+@pytest.mark.parametrize("scale", [0.25, 0.5, 1 / 3])
+@pytest.mark.parametrize("separator_height", [20, 27])
+def test_pyramid_matches_exhaustive_at_every_row_phase(scale, separator_height):
+    # 页面高度逐行递增，分割线依次落在缩小网格的每一个行相位上
+    rows = round(1 / scale)
+    heights = [300 + i for i in range(3 * rows)]
+    separators, height = page_layout(30, heights, separator_height)
+    image = make_screenshot(separators, height, separator_height=separator_height)
+    template = image[30 : 30 + separator_height]
+
+    exhaustive = split_rows(image, template, "template")
+    pyramid = split_rows(image, template, "pyramid", scale=scale)
+
+    assert exhaustive == separators
+    assert len(pyramid) == len(exhaustive)
+    assert np.all(np.abs(np.array(pyramid) - exhaustive) <= 1)
+
+
+def test_pyramid_finds_boundary_off_the_coarse_grid():
+    # 分割线从第 30 行开始（不是 4 的倍数），单独缩小的模板与图片行相位不一致
+    separators, height = page_layout(30, [774, 600], 20)
+    image = make_screenshot(separators, height)
+    template = image[30:50]
+
+    assert split_rows(image, template, "pyramid", scale=0.25) == separators
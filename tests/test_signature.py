@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from conftest import make_screenshot, page_layout, split_rows
+from src.matching import compute_match_scores
+
+
+def layout(separator_height=20):
+    separators, height = page_layout(37, [401, 388, 415, 396, 402], separator_height)
+    return separators, height
+
+
+@pytest.mark.parametrize("columns", [16, 64, 600])
+def test_signature_matches_template_on_color_screenshot(columns):
+    separators, height = layout()
+    image = make_screenshot(separators, height)
+    template = image[37:57]
+
+    expected = split_rows(image, template, "template")
+    assert expected == separators
+    assert split_rows(image, template, "signature", columns=columns) == expected
+
+
+def test_signature_matches_template_on_grayscale_screenshot():
+    separators, height = layout()
+    image = make_screenshot(separators, height)[:, :, 1].copy()
+    template = image[37:57]
+
+    expected = split_rows(image, template, "template")
+    assert expected == separators
+    assert split_rows(image, template, "signature") == expected
+
+
+def test_signature_matches_template_with_flat_regions():
+    # 空白页面的滑动窗口方差为 0，两种方法都不能在这里产生分割点
+    separators, height = layout()
+    image = make_screenshot(separators, height, blank_pages=(1, 3))
+    template = image[37:57]
+
+    expected = split_rows(image, template, "template")
+    assert expected == separators
+    assert split_rows(image, template, "signature") == expected
+
+
+def test_signature_scores_agree_with_template_scores_at_full_width():
+    # columns 等于图片宽度时行签名就是原始像素，得分应与 TM_CCOEFF_NORMED 一致
+    separators, height = layout()
+    image = make_screenshot(separators, height, width=200)
+    template = image[37:57]
+
+    exhaustive = compute_match_scores(image, template, "template")
+    signature = compute_match_scores(image, template, "signature", columns=200)
+    assert signature.shape == exhaustive.shape
+    # 纯色窗口中 OpenCV 的结果取决于浮点误差，只比较有内容的位置
+    textured = np.abs(exhaustive) > 1e-3
+    np.testing.assert_allclose(signature[textured], exhaustive[textured], atol=1e-3)